@@ -1,4 +1 @@
-import todd.tasklib
-import todd.taskui
-
 version = "0.0.7"
@@ -0,0 +1,100 @@
+"""Commands for shell scripts and cron jobs
+
+They only use todd.tasklib, the UI is never imported. Each command returns the lines to print.
+"""
+
+import datetime
+from todd.tasklib import Tasklist, Util
+
+
+class CommandError(Exception):
+    pass
+
+
+def format_task(task):
+    return "{0:>4} {1}".format(task.task_id, task.raw)
+
+
+def get_task(tasklist, task_id):
+    task = tasklist.get_by_id(int(task_id)) if task_id.isdigit() else None
+    if task is None:
+        raise CommandError("No task with ID {0}".format(task_id))
+    return task
+
+
+def add_task(tasklist, text):
+    """Add a task like the UI does, relative due dates are resolved."""
+    if not text.strip():
+        raise CommandError("Empty task")
+    task = tasklist.insert_new(-1, text)
+    task.update_relative_due_date()
+    if not task.creation_date:
+        task.set_creation_date(Util.get_today())
+    tasklist.save()
+    return [format_task(task)]
+
+
+def list_tasks(tasklist, filters, sort_by="due", show_all=False):
+    """List the tasks with all @contexts in filters containing all other words."""
+    if sort_by not in Tasklist.sort_keys:
+        raise CommandError("Unknown sort order {0}".format(sort_by))
+    contexts = [f for f in filters if f.startswith("@") and len(f) > 1]
+    words = [f for f in filters if f not in contexts]
+    items = tasklist.get_items_sorted(sort_by, contexts[0] if contexts else None)
+    for context in contexts[1:]:
+        items = Tasklist.filter_context(items, context)
+    if not show_all:
+        items = Tasklist.filter_pending(items)
+    if words:
+        items = tasklist.search_items(" ".join(words), items)
+    return [format_task(t) for t in items]
+
+
+def complete_tasks(tasklist, task_ids):
+    """Mark the tasks as done and archive them, recurring tasks get their next due date."""
+    # each task once, even if its ID is repeated
+    tasks = {}
+    for task_id in task_ids:
+        task = get_task(tasklist, task_id)
+        tasks[task.task_id] = task
+    res = []
+    for task in tasks.values():
+        if task.tasklist is None:
+            continue  # archived meanwhile
+        res.append("Done: " + task.raw)
+        if tasklist.complete_task(task):
+            res.append(format_task(task))
+    return res
+
+
+def set_due(tasklist, task_id, text):
+    """Set the due date to an ISO date or a date relative to the current due date (or today)."""
+    task = get_task(tasklist, task_id)
+    try:
+        due = datetime.datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        # mod_date_by falls back to today for anything it does not understand
+        if not Util.is_date_mod(text):
+            raise CommandError("Invalid date {0}".format(text))
+        due = Util.mod_date_by(task.get_due() or Util.get_today(), text)
+    task.set_due(due)
+    tasklist.save()
+    return [format_task(task)]
+
+
+COMMANDS = {
+    "add": lambda tasklist, args: add_task(tasklist, " ".join(args["TEXT"])),
+    "list": lambda tasklist, args: list_tasks(
+        tasklist, args["FILTER"], args["--sort"], args["--all"]
+    ),
+    "done": lambda tasklist, args: complete_tasks(tasklist, args["ID"]),
+    "due": lambda tasklist, args: set_due(tasklist, args["ID"][0], args["DATE"]),
+}
+
+
+def get_command(arguments):
+    """Return the command selected by the docopt arguments as fn(tasklist, arguments) or None."""
+    for name, command in COMMANDS.items():
+        if arguments.get(name):
+            return command
+    return None
@@ -1,7 +1,12 @@
 """todd
 
 Usage:
+  todd [--config FILE] [--file FILE] [--done FILE] add TEXT...
+  todd [--config FILE] [--file FILE] [--done FILE] list [--all] [--sort ORDER] [FILTER...]
+  todd [--config FILE] [--file FILE] [--done FILE] done ID...
+  todd [--config FILE] [--file FILE] [--done FILE] due ID DATE
   todd [--config FILE] [TODOFILE] [DONEFILE]
+  todd [--config FILE] [--done FILE] --workspace PATH...
   todd (-h | --help)
   todd --version
   todd --show-default-bindings
@@ -11,6 +16,22 @@ Options:
   -h --help                           Show this screen.
   --version                           Show version.
   --show-default-bindings             Show default keybindings in config parser format
+  -w --workspace                      Show the tasks of several todo files (or directories)
+  -f FILE --file=FILE                 Path to the todo.txt file (or workspace directory)
+  -d FILE --done=FILE                 Path to the done.txt file
+  -a --all                            List done tasks too
+  -s ORDER --sort=ORDER               Sort by due, prio or created [default: due]
+
+A directory as TODOFILE opens its todo.txt and *.todo.txt files and the todo.txt files of
+its subdirectories as a workspace (other files can be given as PATH).
+
+Commands (without starting the UI):
+  add TEXT...                         Add a task, "due:3" etc. are replaced by the date
+  list [FILTER...]                    List the pending tasks (with all @contexts and words)
+  done ID...                          Mark tasks as done and archive them
+  due ID DATE                         Set the due date to DATE (2000-01-01, tomorrow, +3d)
+
+Task IDs are the numbers shown by list, they stay the same until the file is changed.
 """
 
 import sys
@@ -22,8 +43,8 @@ import os
 from collections import OrderedDict
 from docopt import docopt
 import todd
-from todd.tasklib import Tasklist
-from todd.taskui import MainUI, ColorScheme, KeyBindings
+from todd import cli
+from todd.tasklib import Tasklist, Workspace
 import configparser
 
 
@@ -33,11 +54,13 @@ def exit_with_error(message):
     exit(1)
 
 
-def get_real_path(filename, description):
+def get_real_path(filename, description, allow_dir=False):
     # expand enviroment variables and username, get canonical path
     file_path = os.path.realpath(os.path.expanduser(os.path.expandvars(filename)))
 
     if os.path.isdir(file_path):
+        if allow_dir:
+            return file_path
         exit_with_error("ERROR: Specified {0} file is a directory.".format(description))
 
     if not os.path.exists(file_path):
@@ -75,6 +98,8 @@ def main():
     cfg.add_section("keys")
 
     if arguments["--show-default-bindings"]:
+        from todd.taskui import KeyBindings
+
         d = {k: ", ".join(v) for k, v in KeyBindings({}).key_bindings.items()}
         cfg._sections["keys"] = OrderedDict(sorted(d.items(), key=lambda t: t[0]))
         cfg.write(sys.stdout)
@@ -83,19 +108,13 @@ def main():
     cfg.add_section("settings")
     cfg.read(os.path.expanduser(arguments["--config"]))
 
-    # Load keybindings specified in the [keys] section of the config file
-    keyBindings = KeyBindings(dict(cfg.items("keys")))
-
-    # load the colorscheme defined in the user config, else load the default scheme
-    colorscheme = ColorScheme(dict(cfg.items("settings")).get("colorscheme", "default"), cfg)
-
     # Load the todo.txt file specified in the [settings] section of the config file
     # a todo.txt file on the command line takes precedence
     todotxt_file = dict(cfg.items("settings")).get("file", arguments["TODOFILE"])
-    if arguments["TODOFILE"]:
-        todotxt_file = arguments["TODOFILE"]
+    if arguments["TODOFILE"] or arguments["--file"]:
+        todotxt_file = arguments["TODOFILE"] or arguments["--file"]
 
-    if todotxt_file is None:
+    if todotxt_file is None and not arguments["--workspace"]:
         exit_with_error(
             (
                 "ERROR: No todo file specified. Either specify one as an argument "
@@ -109,7 +128,16 @@ def main():
     if arguments["DONEFILE"]:
         donetxt_file = arguments["DONEFILE"]
 
-    todotxt_file_path = get_real_path(todotxt_file, "todo.txt")
+    if arguments["--done"]:
+        donetxt_file = arguments["--done"]
+
+    # a workspace shows the tasks of several files
+    if arguments["--workspace"]:
+        todotxt_files = arguments["PATH"]
+    else:
+        todotxt_files = [todotxt_file]
+
+    todotxt_file_paths = [get_real_path(f, "todo.txt", allow_dir=True) for f in todotxt_files]
 
     if donetxt_file is not None:
         donetxt_file_path = get_real_path(donetxt_file, "done.txt")
@@ -117,23 +145,55 @@ def main():
         donetxt_file_path = None
 
     try:
-        tasklist = Tasklist.open_file(todotxt_file_path, donetxt_file_path)
+        if len(todotxt_file_paths) == 1 and not os.path.isdir(todotxt_file_paths[0]):
+            tasklist = Tasklist.open_file(todotxt_file_paths[0], donetxt_file_path)
+        else:
+            tasklist = Workspace.open_files(todotxt_file_paths, donetxt_file_path)
+        tasklist.search_index = get_boolean_config_option(cfg, "settings", "search-index")
+        tasklist.parse_cache = get_boolean_config_option(cfg, "settings", "parse-cache")
+        # report unreadable files here rather than on first use
+        tasklist.load()
     except Exception:
         exit_with_error(
             (
                 "ERROR: unable to open {0}\n\nEither specify one as an argument on the "
                 + "command line or set it in your configuration file ({1})."
-            ).format(todotxt_file_path, arguments["--config"])
+            ).format(", ".join(todotxt_file_paths), arguments["--config"])
         )
 
+    command = cli.get_command(arguments)
+    if command:
+        try:
+            for line in command(tasklist, arguments):
+                print(line)
+        except cli.CommandError as e:
+            exit_with_error("ERROR: {0}".format(e))
+        tasklist.save_parse_cache()
+        exit(0)
+
+    # the UI is only imported when it is shown
+    from todd.taskui import MainUI, ColorScheme, KeyBindings
+
+    # Load keybindings specified in the [keys] section of the config file
+    keyBindings = KeyBindings(dict(cfg.items("keys")))
+
+    # load the colorscheme defined in the user config, else load the default scheme
+    colorscheme = ColorScheme(dict(cfg.items("settings")).get("colorscheme", "default"), cfg)
+
     enable_word_wrap = get_boolean_config_option(cfg, "settings", "enable-word-wrap")
 
-    view = MainUI(tasklist, keyBindings, colorscheme)
-    view.main(enable_word_wrap)  # start up the urwid UI event loop
+    # save in the background, the writer is flushed on quit
+    tasklist.start_writer()
+    try:
+        view = MainUI(tasklist, keyBindings, colorscheme)
+        view.main(enable_word_wrap)  # start up the urwid UI event loop
 
-    # Final save
-    view.tasklist.save()
+        # Final save
+        view.tasklist.save()
+    finally:
+        tasklist.stop_writer()
 
+    tasklist.save_parse_cache()
     exit(0)
 
 
@@ -1,3 +1,4 @@
 from .util import Util
 from .task import Task
 from .tasklist import Tasklist
+from .workspace import Workspace
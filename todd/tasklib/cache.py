@@ -0,0 +1,54 @@
+import marshal
+import os
+from todd.tasklib.writer import write_atomic
+
+
+class ParseCache:
+    """Parsed fields of the tasks of a file, kept in a hidden file next to it
+
+    Each line is stored with its fields (see Task.get_fields). If the lines of the file are
+    the ones in the cache the fields are used as they are, otherwise they are looked up by
+    line so only new or edited lines have to be parsed.
+    """
+
+    VERSION = 1
+    FIELD_TYPES = (str, tuple, tuple, str, str, str, str)
+
+    def __init__(self, file_path):
+        directory, name = os.path.split(file_path)
+        self.path = os.path.join(directory, "." + name + ".cache")
+
+    def load(self, text_items):
+        """Return the fields for each of text_items (None if not cached) or None without a cache."""
+        try:
+            with open(self.path, "rb") as file:
+                version, raws, fields = marshal.loads(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != ParseCache.VERSION or not ParseCache.is_valid(raws, fields):
+            return None
+        if raws == text_items:
+            return fields
+        by_raw = dict(zip(raws, fields))
+        return [by_raw.get(raw) for raw in text_items]
+
+    @staticmethod
+    def is_valid(raws, fields):
+        """Check that a loaded cache has one entry of the shape of get_fields per line."""
+        if type(raws) is not list or type(fields) is not list or len(raws) != len(fields):
+            return False
+        types = ParseCache.FIELD_TYPES
+        return all(type(raw) is str for raw in raws) and all(
+            type(values) is tuple and tuple(map(type, values)) == types for values in fields
+        )
+
+    def save(self, tasks):
+        """Write the fields of tasks, tasks that were not parsed yet are left out."""
+        raws = []
+        fields = []
+        for t in tasks:
+            values = t.get_fields()
+            if values is not None:
+                raws.append(t.raw)
+                fields.append(values)
+        write_atomic(self.path, marshal.dumps((ParseCache.VERSION, raws, fields)))
@@ -0,0 +1,54 @@
+import datetime
+from todd.tasklib.task import Task
+from todd.tasklib.util import Util
+
+
+class Clock:
+    """Date snapshot used while rendering
+
+    update() takes a new snapshot, once per render. Date names and task states depend only on
+    the date and today, they are cached until the date changes.
+    """
+
+    def __init__(self, get_today=datetime.date.today):
+        self.get_today = get_today
+        self.today = None
+        self.update()
+
+    def update(self):
+        """Take a snapshot of the date, returns True if it changed."""
+        today = self.get_today()
+        if today == self.today:
+            return False
+        self.today = today
+        self.today_str = today.isoformat()
+        self.next_monday_str = (today + datetime.timedelta(days=7 - today.weekday())).isoformat()
+        self.date_names = {}
+        self.states = {}
+        return True
+
+    def get_seconds_to_midnight(self, now=None):
+        now = now or datetime.datetime.now()
+        midnight = datetime.datetime.combine(now.date() + Util.delta1, datetime.time())
+        return (midnight - now).total_seconds()
+
+    def get_date_name(self, due_date):
+        """Return the name of the ISO date due_date ("" for none) relative to today."""
+        res = self.date_names.get(due_date)
+        if res is None:
+            date = datetime.datetime.strptime(due_date, "%Y-%m-%d").date() if due_date else None
+            res = self.date_names[due_date] = Util.get_date_name(date, today=self.today)
+        return res
+
+    def get_status(self, task, due_date=None):
+        """Return task.get_status for today and next monday (as if due on due_date if given)."""
+        if task.is_done() or task.is_deleted():
+            return ("done", 99999)
+        if due_date is None:
+            due_date = task.due_date
+        res = self.states.get(due_date)
+        if res is None:
+            res = self.states[due_date] = Task.get_due_status(
+                due_date, self.today_str, self.next_monday_str
+            )
+        return res
@@ -0,0 +1,206 @@
+import bisect
+from todd.tasklib.matcher import is_ascii
+
+
+class TermIndex:
+    """Inverted index from the terms of a task attribute (like contexts) to task ids"""
+
+    def __init__(self, attr):
+        self.attr = attr
+        self.ids = {}
+        self._sorted = None
+
+    def build(self, tasks):
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task):
+        for term in getattr(task, self.attr):
+            ids = self.ids.get(term)
+            if ids is None:
+                ids = self.ids[term] = set()
+                self._sorted = None
+            ids.add(task.task_id)
+
+    def remove(self, task):
+        for term in getattr(task, self.attr):
+            ids = self.ids.get(term)
+            if ids is not None:
+                ids.discard(task.task_id)
+                if not ids:
+                    del self.ids[term]
+                    self._sorted = None
+
+    def get_ids(self, term):
+        return self.ids.get(term, frozenset())
+
+    def get_terms(self):
+        if self._sorted is None:
+            self._sorted = sorted(self.ids)
+        return self._sorted
+
+    def get_counts(self):
+        return {term: len(ids) for term, ids in self.ids.items()}
+
+
+class SortedIndex:
+    """Task ids ordered by a key function, repositioned with bisect when a task changes"""
+
+    def __init__(self, key):
+        self.key = key
+        self.entries = []  # sorted (key, task_id)
+        self.task_entries = {}
+
+    def build(self, tasks):
+        self.task_entries = {task.task_id: (self.key(task), task.task_id) for task in tasks}
+        self.entries = sorted(self.task_entries.values())
+
+    def add(self, task):
+        entry = (self.key(task), task.task_id)
+        self.task_entries[task.task_id] = entry
+        bisect.insort(self.entries, entry)
+
+    def remove(self, task):
+        entry = self.task_entries.pop(task.task_id, None)
+        if entry is not None:
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def get_ids(self, ids=None):
+        """Return all task ids in order or only those in ids."""
+        if ids is None:
+            return [entry[1] for entry in self.entries]
+        return [entry[1] for entry in sorted(self.task_entries[task_id] for task_id in ids)]
+
+
+class DueIndex(SortedIndex):
+    """Pending tasks with a due date ordered by it"""
+
+    def __init__(self):
+        super(DueIndex, self).__init__(lambda task: task.due_date)
+
+    @staticmethod
+    def is_pending(task):
+        return task.due_date and not (task.is_done() or task.is_deleted())
+
+    def build(self, tasks):
+        super(DueIndex, self).build([task for task in tasks if DueIndex.is_pending(task)])
+
+    def add(self, task):
+        if DueIndex.is_pending(task):
+            super(DueIndex, self).add(task)
+
+    def get_ids_until(self, due_date):
+        """Return the ids of the tasks due on or before the ISO date due_date."""
+        end = bisect.bisect_right(self.entries, (due_date, float("inf")))
+        return [entry[1] for entry in self.entries[:end]]
+
+
+class TaskCounter:
+    """Number of pending and done tasks, and of the pending tasks by due date
+
+    With accept only the tasks for which accept(task) is true are counted.
+    """
+
+    def __init__(self, accept=None):
+        self.accept = accept
+        self.pending = 0
+        self.done = 0
+        self.due_dates = {}  # due date -> number of pending tasks
+        self._due_counts = None  # (today, due, overdue)
+
+    def build(self, tasks):
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task, n=1):
+        if self.accept is not None and not self.accept(task):
+            return
+        if task.is_done():
+            self.done += n
+        else:
+            self.pending += n
+            if task.due_date:
+                count = self.due_dates.get(task.due_date, 0) + n
+                if count:
+                    self.due_dates[task.due_date] = count
+                else:
+                    del self.due_dates[task.due_date]
+                self._due_counts = None
+
+    def remove(self, task):
+        self.add(task, -1)
+
+    def get_due_counts(self, today):
+        """Return the number of pending tasks due (on or before the ISO date today) and overdue."""
+        if self._due_counts is None or self._due_counts[0] != today:
+            due = overdue = 0
+            for due_date, count in self.due_dates.items():
+                if due_date < today:
+                    overdue += count
+                elif due_date == today:
+                    due += count
+            self._due_counts = (today, due + overdue, overdue)
+        return self._due_counts[1:]
+
+    def get_stats(self, today):
+        due, overdue = self.get_due_counts(today)
+        return {"pending": self.pending, "done": self.done, "due": due, "overdue": overdue}
+
+
+def _trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Case insensitive trigram index over the raw text of the tasks
+
+    Tasks that are not plain ASCII are not indexed and always returned as candidates (case
+    insensitive regular expressions match some non ASCII characters to ASCII ones).
+    """
+
+    def __init__(self):
+        self.ids = {}  # trigram -> set of task ids
+        self.other = set()  # task ids that are not indexed
+
+    def build(self, tasks):
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task):
+        if not is_ascii(task.raw):
+            self.other.add(task.task_id)
+            return
+        for trigram in _trigrams(task.raw.lower()):
+            ids = self.ids.get(trigram)
+            if ids is None:
+                ids = self.ids[trigram] = set()
+            ids.add(task.task_id)
+
+    def remove(self, task):
+        if not is_ascii(task.raw):
+            self.other.discard(task.task_id)
+            return
+        for trigram in _trigrams(task.raw.lower()):
+            ids = self.ids.get(trigram)
+            if ids is not None:
+                ids.discard(task.task_id)
+                if not ids:
+                    del self.ids[trigram]
+
+    def get_candidates(self, terms):
+        """Return the ids of the tasks that may contain all terms or None if any task may."""
+        postings = []
+        for term in terms:
+            if not is_ascii(term):
+                continue
+            for trigram in _trigrams(term.lower()):
+                postings.append(self.ids.get(trigram, frozenset()))
+        if not postings:
+            return None
+        postings.sort(key=len)
+        res = set(postings[0])
+        for ids in postings[1:]:
+            if not res:
+                break
+            res &= ids
+        return res | self.other
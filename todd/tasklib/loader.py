@@ -0,0 +1,109 @@
+import contextlib
+import gc
+import os
+
+
+def read_lines(path):
+    """Yield the lines of a file as bytes, including the line break.
+
+    The file is read in buffered blocks, so its content is never held in memory as a whole.
+    It is not memory mapped, another program truncating the file while it is read would
+    kill the process (SIGBUS) then.
+    """
+    with open(path, "rb") as file:
+        yield from file
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """Pause the garbage collector while creating many objects that are kept.
+
+    Otherwise every few hundred new objects trigger a collection that scans all of them again.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_lines_reverse(file, end, block_size=8192):
+    """Yield (offset, line) for the lines of a binary file before end, the last line first.
+
+    The file is read backwards in blocks, lines are returned without the line break.
+    """
+    pos = end
+    rest = b""
+    while pos > 0:
+        size = min(block_size, pos)
+        pos -= size
+        file.seek(pos)
+        block = file.read(size) + rest
+        lines = block.split(b"\n")
+        rest = lines[0]
+        line_end = pos + len(block)
+        for line in reversed(lines[1:]):
+            start = line_end - len(line)
+            yield (start, line)
+            line_end = start - 1
+    yield (0, rest)
+
+
+class TailIndex:
+    """Start offsets of the last non blank lines of a file.
+
+    Filled by reading the file backwards, count lines at a time. The index is only valid
+    while the file has the size and mtime recorded by reset/update_stat. Lines appended
+    through the index can also have a source (the file a task was archived from).
+    """
+
+    def __init__(self, count=100):
+        self.count = count
+        self.starts = []
+        self.sources = {}  # start -> source of the appended lines
+        self.scanned = 0  # the file before this offset was not scanned yet
+        self.stat = None
+
+    @staticmethod
+    def get_stat(file):
+        stat = os.fstat(file.fileno())
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def is_valid(self, file):
+        return self.stat is not None and self.stat == TailIndex.get_stat(file)
+
+    def reset(self, file):
+        self.stat = TailIndex.get_stat(file)
+        self.starts = []
+        self.sources = {}
+        self.scanned = self.stat[0]
+
+    def update_stat(self, file):
+        self.stat = TailIndex.get_stat(file)
+
+    def fill(self, file):
+        found = []
+        for offset, line in read_lines_reverse(file, self.scanned):
+            if line.strip():
+                found.append(offset)
+                if len(found) == self.count:
+                    break
+        self.scanned = found[-1] if len(found) == self.count else 0
+        self.starts[:0] = reversed(found)
+
+    def pop(self, file):
+        """Remove and return the start of the last non blank line (None if there is none)."""
+        if not self.starts and self.scanned > 0:
+            self.fill(file)
+        return self.starts.pop() if self.starts else None
+
+    def append(self, offset, source=None):
+        self.starts.append(offset)
+        if source is not None:
+            self.sources[offset] = source
+
+    def pop_source(self, offset):
+        """Remove and return the source of the line at offset (None if it was not appended)."""
+        return self.sources.pop(offset, None)
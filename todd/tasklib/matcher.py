@@ -0,0 +1,165 @@
+import heapq
+import re
+
+
+def is_ascii(text):
+    return len(text) == len(text.encode("utf-8"))
+
+
+def _merge_spans(spans):
+    spans.sort()
+    merged = [spans[0]]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _match_term(term, key):
+    """Return (score, spans) of term in key or None if it is not a subsequence of key."""
+    start = key.find(term)
+    if start >= 0:
+        score = 3 * len(term)
+        if start == 0 or not key[start - 1].isalnum():
+            score += len(term)  # start of a word
+        return (score, [(start, start + len(term))])
+    spans = []
+    gaps = 0
+    pos = -1
+    for c in term:
+        found = key.find(c, pos + 1)
+        if found < 0:
+            return None
+        if spans and found == pos + 1:
+            spans[-1] = (spans[-1][0], found + 1)
+        else:
+            if spans:
+                gaps += found - pos - 1
+            spans.append((found, found + 1))
+        pos = found
+    return (2 * len(term) / (1 + gaps / len(term)), spans)
+
+
+class TermMatcher:
+    """Case insensitive search for texts containing all terms
+
+    Plain ASCII is matched with str.find on the lower cased text. Anything else falls back to
+    regular expressions, lower() may change the length of a text or not match what a case
+    insensitive regular expression would.
+
+    Matchers are shared (see Tasklist.prep_search) and keep no state between calls.
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.lower_terms = [term.lower() for term in terms]
+        self.ascii = all(is_ascii(term) for term in terms)
+        self.regexes = [re.compile(re.escape(term), re.IGNORECASE) for term in terms]
+
+    def __repr__(self):
+        return "TermMatcher({!r})".format(self.terms)
+
+    def get_spans(self, text):
+        """Return the sorted (start, end) spans of all terms in text.
+
+        Overlapping spans are merged. Returns None unless text contains all terms.
+        """
+        spans = []
+        if self.ascii and is_ascii(text):
+            lower = text.lower()
+            for term in self.lower_terms:
+                start = lower.find(term)
+                if start < 0:
+                    return None
+                while start >= 0:
+                    end = start + len(term)
+                    spans.append((start, end))
+                    start = lower.find(term, end)
+        else:
+            for regex in self.regexes:
+                found = [m.span() for m in regex.finditer(text)]
+                if not found:
+                    return None
+                spans += found
+        return _merge_spans(spans)
+
+    def search(self, items):
+        """Return the items whose raw text contains all terms."""
+        get_spans = self.get_spans
+        return [item for item in items if get_spans(item.raw) is not None]
+
+    def get_highlight(self, text, attr):
+        """Return text as urwid markup with the terms marked as attr."""
+        spans = self.get_spans(text)
+        if not spans:
+            return text
+        res = []
+        pos = 0
+        for start, end in spans:
+            if start > pos:
+                res.append(text[pos:start])
+            res.append((attr, text[start:end]))
+            pos = end
+        if pos < len(text):
+            res.append(text[pos:])
+        return res
+
+
+class FuzzyMatcher(TermMatcher):
+    """Ranks texts by how closely they contain the terms
+
+    Each term has to be a subsequence of the text. Whole terms score higher than scattered
+    characters (more so at the start of a word) and terms close to each other score higher
+    than terms far apart. Texts are compared by their lower cased search_key.
+    """
+
+    def __init__(self, terms, limit=100):
+        super(FuzzyMatcher, self).__init__(terms)
+        self.limit = limit
+
+    def __repr__(self):
+        return "FuzzyMatcher({!r})".format(self.terms)
+
+    def get_score(self, key):
+        """Return (score, spans) for the lower cased key or None if it doesn't match."""
+        total = 0
+        spans = []
+        starts = []
+        for term in self.lower_terms:
+            res = _match_term(term, key)
+            if res is None:
+                return None
+            score, term_spans = res
+            total += score
+            starts.append(term_spans[0][0])
+            spans += term_spans
+        total -= (max(starts) - min(starts)) / (len(key) + 1)
+        return (total, spans)
+
+    def get_spans(self, text):
+        key = text.lower()
+        res = self.get_score(key)
+        if res is None or len(key) != len(text):
+            return None
+        return _merge_spans(res[1])
+
+    def filter(self, items):
+        """Return all items that match, in their order (not ranked)."""
+        get_score = self.get_score
+        return [item for item in items if get_score(item.search_key) is not None]
+
+    def search(self, items):
+        """Return the best limit matches, best first (ties keep the order of items)."""
+
+        def scored():
+            get_score = self.get_score
+            for i, item in enumerate(items):
+                res = get_score(item.search_key)
+                if res is not None:
+                    yield (res[0], -i, item)
+
+        best = heapq.nlargest(self.limit, scored(), key=lambda entry: entry[:2])
+        return [entry[2] for entry in best]
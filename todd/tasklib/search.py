@@ -0,0 +1,58 @@
+from todd.tasklib.tasklist import Tasklist
+
+
+def is_narrowed(old_terms, new_terms):
+    """True if every task matching new_terms also matches old_terms."""
+    new_terms = [term.lower() for term in new_terms]
+    return all(any(old.lower() in new for new in new_terms) for old in old_terms)
+
+
+class SearchSession:
+    """Search while typing.
+
+    The result of the last query is kept and, as long as the query only gets more specific
+    (like "ca" -> "cal" or "cal" -> "cal @ho"), the next query just filters that result.
+    Anything else (backspace, a changed key) falls back to a full scan.
+    """
+
+    def __init__(self, tasklist=None):
+        self.tasklist = tasklist  # uses its search index for full scans
+        self.full_scans = 0
+        self.reset()
+
+    def reset(self):
+        self.key = None
+        self.items = None
+        self.terms = None
+        self.result = None
+
+    def search(self, key, get_items, search_string):
+        """Return the items matching search_string.
+
+        get_items() is only called to get the items to search when key differs from the last
+        call, so key has to change whenever those items might have changed.
+        """
+        if key != self.key or self.items is None:
+            self.key = key
+            self.items = get_items()
+            self.terms = None
+            self.result = None
+
+        search = Tasklist.prep_search(search_string)
+        if not search:
+            self.terms = None
+            self.result = None
+            return self.items
+
+        terms = search.terms
+        if self.terms is not None and is_narrowed(self.terms, terms):
+            items = self.result
+        else:
+            items = self.items
+            self.full_scans += 1
+        self.terms = terms
+        if self.tasklist is not None and items is self.items:
+            self.result = self.tasklist.search_items(search_string, items)
+        else:
+            self.result = Tasklist.search(search, items)
+        return self.result
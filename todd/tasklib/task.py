@@ -1,8 +1,64 @@
 import re
+import sys
 import datetime
+import functools
 from todd.tasklib import Util
 
 
+def _is_date(text, pos):
+    # same as \d\d\d\d-\d\d-\d\d at pos
+    date = text[pos : pos + 10]
+    return (
+        len(date) == 10
+        and date[4] == "-"
+        and date[7] == "-"
+        and (date[:4] + date[5:7] + date[8:]).isdecimal()
+    )
+
+
+def _skip_space(text, pos):
+    end = len(text)
+    while pos < end and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _match_date(word, pos):
+    return word[pos : pos + 10] if _is_date(word, pos) else ""
+
+
+def _match_rec_int(word, pos):
+    # same as \+?\d+[dwmy] at pos
+    end = pos + 1 if word[pos : pos + 1] == "+" else pos
+    start = end
+    while end < len(word) and word[end].isdecimal():
+        end += 1
+    if end > start and word[end : end + 1] in ("d", "w", "m", "y"):
+        return word[pos : end + 1]
+    return ""
+
+
+@functools.lru_cache(maxsize=4096)
+def _shared_tuple(values):
+    # tuples of contexts/tags shared between tasks, the least recently used are dropped
+    return tuple(sys.intern(v) for v in values)
+
+
+def _share(values):
+    return _shared_tuple(tuple(values))
+
+
+def _scan_word(word, key, match):
+    # return the first KEY:VALUE match inside a word (the regexes are not anchored to words)
+    pos = word.find(key)
+    while pos >= 0:
+        value = match(word, pos + len(key))
+        if value:
+            return value
+        pos = word.find(key, pos + 1)
+    return ""
+
+
 class Task:
     """Task
 
@@ -18,8 +74,27 @@ class Task:
     Known key-value tags are
     - due:2000-01-01    due dates
     - rec:1y            recurring task
+
+    contexts and tags are tuples shared between tasks, dates are interned strings.
+    search_key is the lower cased raw text used for fuzzy search.
+    source is the path of the file the task belongs to in a Workspace (None otherwise).
     """
 
+    __slots__ = (
+        "task_id",
+        "tasklist",
+        "source",
+        "raw",
+        "priority",
+        "contexts",
+        "tags",
+        "done_date",
+        "creation_date",
+        "due_date",
+        "rec_int",
+        "search_key",
+    )
+
     _priority_regex = re.compile(r"\(([A-Z])\) ")
     _context_regex = re.compile(r"(?:^|\s+)(@\S+)")
     _tag_regex = re.compile(r"(?:^|\s+)(\+\S+)")
@@ -39,19 +114,143 @@ class Task:
     PLHR = "\N{HORIZONTAL ELLIPSIS}"
     _plhr_regex = re.compile(PLHR + "[ " + PLHR + "]*")
 
+    # fields set by parse
+    _parsed_fields = frozenset(__slots__[4:])
+
     def __init__(self, item, task_id):
         self.task_id = task_id
+        self.tasklist = None  # the owning Tasklist gets notified of updates
+        self.source = None
         self.update(item)
 
+    @staticmethod
+    def lazy(raw, task_id, source=None):
+        """Create a task from a stripped line that is parsed when its fields are first used."""
+        task = Task.__new__(Task)
+        task.task_id = task_id
+        task.tasklist = None
+        task.source = source
+        task.raw = raw
+        return task
+
+    def __getattr__(self, name):
+        # only called for unset slots
+        if name in Task._parsed_fields:
+            self.parse()
+            return object.__getattribute__(self, name)
+        raise AttributeError(name)
+
     def update(self, text):
+        tasklist = self.tasklist
+        if tasklist is not None:
+            tasklist.before_update(self)
         self.raw = text.strip()
-        self.priority = Task.scan_priority(self.raw)
-        self.contexts = Task.scan_contexts(self.raw)
-        self.tags = Task.scan_tags(self.raw)
-        self.done_date = Task.scan_done_date(self.raw)
-        self.creation_date = Task.scan_creation_date(self.raw)
-        self.due_date = Task.scan_due_date(self.raw)
-        self.rec_int = Task.scan_rec_int(self.raw)
+        self.parse()
+        if tasklist is not None:
+            tasklist.after_update(self)
+
+    @staticmethod
+    def cached(raw, task_id, fields, source=None):
+        """Create a task from a stripped line and its fields as returned by get_fields.
+
+        The fields are used as they are, a ParseCache already shares equal values.
+        """
+        task = Task.lazy(raw, task_id, source)
+        (
+            task.priority,
+            task.contexts,
+            task.tags,
+            task.done_date,
+            task.creation_date,
+            task.due_date,
+            task.rec_int,
+        ) = fields
+        search_key = raw.lower()
+        task.search_key = raw if search_key == raw else search_key
+        return task
+
+    def get_fields(self):
+        """Return the parsed fields (see tokenize) or None if the task was not parsed yet."""
+        try:
+            object.__getattribute__(self, "search_key")
+        except AttributeError:
+            return None
+        return (
+            self.priority,
+            self.contexts,
+            self.tags,
+            self.done_date,
+            self.creation_date,
+            self.due_date,
+            self.rec_int,
+        )
+
+    def parse(self):
+        self.set_fields(Task.tokenize(self.raw))
+
+    def set_fields(self, fields):
+        priority, contexts, tags, done_date, creation_date, due_date, rec_int = fields
+        self.priority = priority
+        self.contexts = _share(contexts)
+        self.tags = _share(tags)
+        self.done_date = sys.intern(done_date)
+        self.creation_date = sys.intern(creation_date)
+        self.due_date = sys.intern(due_date)
+        self.rec_int = sys.intern(rec_int)
+        search_key = self.raw.lower()
+        self.search_key = self.raw if search_key == self.raw else search_key
+
+    @staticmethod
+    def tokenize(text):
+        """Parse a stripped line in a single pass.
+
+        Returns (priority, contexts, tags, done_date, creation_date, due_date, rec_int) with
+        the same results as the individual scan_* methods.
+        """
+        priority = ""
+        done_date = ""
+        creation_date = ""
+        due_date = ""
+        rec_int = ""
+        contexts = []
+        tags = []
+
+        # header: [x DONE ][(P) ][CREATED ]
+        pos = 0
+        if text[:2] == "x " and _is_date(text, 2):
+            if text[12:13] == " ":
+                done_date = text[2:12]
+            if text[12:13].isspace():
+                pos = _skip_space(text, 12)
+        elif text[:1] == "(" and text[2:4] == ") " and "A" <= text[1] <= "Z":
+            priority = text[1]
+        if text[pos : pos + 1] == "(" and text[pos + 2 : pos + 3] == ")":
+            c = text[pos + 1]
+            if (c.isalnum() or c == "_") and text[pos + 3 : pos + 4].isspace():
+                date_pos = _skip_space(text, pos + 3)
+                if _is_date(text, date_pos):
+                    creation_date = text[date_pos : date_pos + 10]
+        if not creation_date and _is_date(text, pos):
+            creation_date = text[pos : pos + 10]
+
+        # body: whitespace separated words
+        for word in text.split():
+            c = word[0]
+            if c == "@":
+                if len(word) > 1:
+                    contexts.append(word)
+            elif c == "+":
+                if len(word) > 1:
+                    tags.append(word)
+            if ":" in word:
+                if not due_date and "due:" in word:
+                    due_date = _scan_word(word, "due:", _match_date)
+                if not rec_int and "rec:" in word:
+                    rec_int = _scan_word(word, "rec:", _match_rec_int)
+
+        contexts.sort()
+        tags.sort()
+        return (priority, contexts, tags, done_date, creation_date, due_date, rec_int)
 
     @staticmethod
     def scan_contexts(text):
@@ -86,6 +285,30 @@ class Task:
         match = Task._done_regex.match(text)
         return match.group(1) if match else ""
 
+    def get_size(self, seen):
+        """Return the bytes used by this task, not counting objects whose id is in seen."""
+        size = sys.getsizeof(self)
+        for value in (
+            self.raw,
+            self.done_date,
+            self.creation_date,
+            self.due_date,
+            self.rec_int,
+            self.search_key,
+        ):
+            if id(value) not in seen:
+                seen.add(id(value))
+                size += sys.getsizeof(value)
+        for values in (self.contexts, self.tags):
+            if id(values) not in seen:
+                seen.add(id(values))
+                size += sys.getsizeof(values)
+                for value in values:
+                    if id(value) not in seen:
+                        seen.add(id(value))
+                        size += sys.getsizeof(value)
+        return size
+
     def __repr__(self):
         return repr(
             {
@@ -109,12 +332,12 @@ class Task:
 
         # Task
         if re.search(self._priority_regex, self.raw):
-            self.raw = re.sub(self._priority_regex, "{}".format(new_priority), self.raw)
+            raw = re.sub(self._priority_regex, "{}".format(new_priority), self.raw)
         elif re.search(r"^x \d{4}-\d{2}-\d{2}", self.raw):
-            self.raw = re.sub(r"^(x \d{4}-\d{2}-\d{2}) ", r"\1 {}".format(new_priority), self.raw)
+            raw = re.sub(r"^(x \d{4}-\d{2}-\d{2}) ", r"\1 {}".format(new_priority), self.raw)
         else:
-            self.raw = "{}{}".format(new_priority, self.raw)
-        self.update(self.raw)
+            raw = "{}{}".format(new_priority, self.raw)
+        self.update(raw)
 
     def is_done(self):
         return self.raw[0:2] == "x "
@@ -152,12 +375,16 @@ class Task:
     def get_status(self, due_date, next_date=None):
         if self.is_done() or self.is_deleted():
             return ("done", 99999)
-        if self.due_date:
-            if self.due_date < due_date:
+        return Task.get_due_status(self.due_date, due_date, next_date)
+
+    @staticmethod
+    def get_due_status(task_due_date, due_date, next_date=None):
+        if task_due_date:
+            if task_due_date < due_date:
                 return ("overdue", -1)
-            elif self.due_date == due_date:
+            elif task_due_date == due_date:
                 return ("due", 0)
-            elif self.due_date < next_date:
+            elif task_due_date < next_date:
                 return ("todo", 1)
             else:
                 return ("todo", 2)
@@ -174,23 +401,49 @@ class Task:
             date = date.date()
         text = " due:" + date.isoformat()
         if self.due_date:
-            self.raw = re.sub(Task._due_date_regex, text + " ", self.raw)
+            self.update(re.sub(Task._due_date_regex, text + " ", self.raw))
         else:
-            self.raw += text
-        self.update(self.raw)
+            self.update(self.raw + text)
 
     def get_due(self):
         return (
             datetime.datetime.strptime(self.due_date, "%Y-%m-%d").date() if self.due_date else None
         )
 
+    def iter_due_dates(self, today=None):
+        """Yield the due date and, for recurring tasks, the due dates of the next occurrences.
+
+        Occurrences after the completion date (rec without +) are projected as if each one
+        was done on its due date, but not before today.
+        """
+        due = self.get_due()
+        if due is None:
+            return
+        yield due
+        if self.rec_int:
+            (prefix, value, itype) = Task._rec_int_parts_regex.match(self.rec_int).groups()
+            value = int(value)
+            if value == 0:
+                return
+            last = due
+            if prefix != "+" and today and due < today:
+                due = today
+            n = 1
+            while True:
+                date = Util.date_add_interval(due, itype, value * n)
+                if date <= last:
+                    return  # does not move forward
+                yield date
+                last = date
+                n += 1
+
     def update_relative_due_date(self):
         if not Task.scan_due_date(self.raw):
             match = Task._any_due_date_regex.search(self.raw)
             if match:
                 date = Util.mod_date_by(Util.get_today(), match.group(1))
                 if date:
-                    self.raw = re.sub(Task._any_due_date_regex, " ", self.raw).strip()
+                    self.update(re.sub(Task._any_due_date_regex, " ", self.raw))
                     self.set_due(date)
 
     def set_creation_date(self, date):
@@ -199,8 +452,7 @@ class Task:
         regex = (
             Task._creation_date_regex if self.creation_date != "" else Task._creation_date_regex2
         )
-        self.raw = re.sub(regex, r"\g<1>\g<2>" + date.isoformat() + " ", self.raw)
-        self.update(self.raw)
+        self.update(re.sub(regex, r"\g<1>\g<2>" + date.isoformat() + " ", self.raw))
 
     def get_desc(self):
         PLHR = " \N{HORIZONTAL ELLIPSIS} "
@@ -1,13 +1,74 @@
+import datetime
+import functools
+import heapq
+import io
 import os
-import re
-import watchdog.events
-import watchdog.observers
+import sys
+from array import array
 from todd.tasklib import Task, Util
+from todd.tasklib.cache import ParseCache
+from todd.tasklib.index import DueIndex, SortedIndex, TaskCounter, TermIndex, TrigramIndex
+from todd.tasklib.loader import TailIndex, paused_gc, read_lines
+from todd.tasklib.matcher import FuzzyMatcher, TermMatcher
+from todd.tasklib.writer import SaveWorker, write_atomic
+
+
+def _sort_key_due(task):
+    res = task.due_date
+    if not res:
+        res = "9999"
+    res += task.raw
+    if not res:
+        res = "z"
+    if task.is_done() or task.is_deleted():
+        res = "z" + res
+    return res
+
+
+def _sort_key_prio(task):
+    if task.is_done() or task.is_deleted():
+        return "z" + task.raw
+    else:
+        return task.raw
+
+
+def _sort_key_created(task):
+    res = task.creation_date
+    res += task.raw
+    if not res:
+        res = "z"
+    if task.is_done() or task.is_deleted():
+        res = "z" + res
+    return res
+
+
+class Delta:
+    """Task ids inserted, updated and deleted by Tasklist.reload"""
+
+    def __init__(self, inserted=None, updated=None, deleted=None):
+        self.inserted = inserted or []
+        self.updated = updated or []
+        self.deleted = deleted or []
+
+    def __bool__(self):
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def __repr__(self):
+        return repr({"inserted": self.inserted, "updated": self.updated, "deleted": self.deleted})
 
 
 class Tasklist:
     def __init__(self, text_items):
         self.next_id = 1
+        self.revision = 0  # incremented on every change to the tasks
+        self.search_index = False  # use a trigram index for search_items
+        self.parse_cache = False  # keep the parsed tasks in a ParseCache
+        self._source = None
+        self._items = []
+        self._update_raw = None
+        self._view_counter = None  # name of the counter index of the last view
+        self.writer = None
+        self.archive_index = TailIndex()
         self.set_text_items(text_items or [])
 
     @staticmethod
@@ -18,9 +79,29 @@ class Tasklist:
             tasklist.archive_path = archive_path
         else:
             tasklist.archive_path = os.path.join(os.path.dirname(file_path), "done.txt")
-        tasklist.reload()
+        # the file is loaded on first use (or by load), fail now if it can't be opened
+        with open(file_path, "rb"):
+            pass
+        tasklist.file_m = os.path.getmtime(file_path)
+        tasklist._source = file_path
+        tasklist.set_saved(None)
         return tasklist
 
+    @property
+    def _items(self):
+        if self._source is not None:
+            self.reload()
+        return self._task_items
+
+    @_items.setter
+    def _items(self, items):
+        self._task_items = items
+
+    def load(self):
+        """Read the file now if it was not read yet, raises the errors of reading it."""
+        if self._source is not None:
+            self.reload()
+
     def get_next_id(self):
         res = self.next_id
         self.next_id += 1
@@ -30,28 +111,166 @@ class Tasklist:
         return self.file_m != os.path.getmtime(self.file_path)
 
     def reload(self):
+        if self.writer:
+            self.writer.flush()
+        self._source = None
+        self.file_m = os.path.getmtime(self.file_path)
+        text_items, line_ends = Tasklist.split_lines(read_lines(self.file_path))
+        if self._items:
+            delta = self.update_text_items(text_items)
+        else:
+            self.set_tasks(self.create_tasks(text_items, self.file_path))
+            delta = Delta([t.task_id for t in self._items])
+        self.set_saved(line_ends)
+        return delta
+
+    def create_tasks(self, text_items, file_path, source=None):
+        # tasks are parsed on first use, unless their fields are in the parse cache
+        with paused_gc():
+            fields = ParseCache(file_path).load(text_items) if self.parse_cache else None
+            if fields is None:
+                return [Task.lazy(raw, self.get_next_id(), source) for raw in text_items]
+            return [
+                (
+                    Task.lazy(raw, self.get_next_id(), source)
+                    if values is None
+                    else Task.cached(raw, self.get_next_id(), values, source)
+                )
+                for raw, values in zip(text_items, fields)
+            ]
+
+    def save_parse_cache(self):
+        """Write the parsed tasks to the parse cache, if it is used and the file is saved."""
+        if not self.parse_cache or self.is_dirty() or self.has_file_changed():
+            return False
+        ParseCache(self.file_path).save(self._items)
+        return True
+
+    @staticmethod
+    def split_lines(lines):
+        """Decode lines (bytes including the line break) and return the stripped, non empty ones.
+
+        Also returns the end offset of each line if saving the parsed lines would reproduce
+        the input exactly (otherwise None).
+        """
+        text_items = []
+        line_ends = array("q")
+        end = 0
+        for line in lines:
+            # universal newlines
+            for part in line.splitlines(True) if b"\r" in line else (line,):
+                text = part.decode("utf-8")
+                raw = text.strip()
+                if raw:
+                    text_items.append(raw)
+                if line_ends is not None:
+                    if raw and len(raw) == len(text) - 1 and text[-1] == "\n":
+                        end += len(part)
+                        line_ends.append(end)
+                    else:
+                        line_ends = None
+        return (text_items, line_ends)
+
+    def set_saved(self, line_ends):
+        # the file matches _items, line_ends holds the byte offset after each line or None if unknown
+        self._line_ends = line_ends
+        self._dirty_ids = set()
+        self._dirty_from = None
+
+    def set_dirty_from(self, index):
+        if self._dirty_from is None or index < self._dirty_from:
+            self._dirty_from = index
+
+    def is_dirty(self):
+        return bool(self._dirty_ids) or self._dirty_from is not None
+
+    def save(self, full=False):
+        """Write changes to the file, returns False if there was nothing to save.
+
+        Only the lines from the first changed one are rewritten, changed lines that keep their
+        length are patched in place. The whole file is written if it was changed by someone else.
+        With a writer the file is replaced in the background instead.
+        """
+        if not full and not self.is_dirty():
+            return False
+        if self.writer:
+            self.writer.submit([t.raw for t in self._items])
+            self.set_saved(None)
+            return True
+        line_ends = self._line_ends
+        if full or line_ends is None or self.has_file_changed():
+            self.write_from(0, [], array("q"))
+            return True
+
+        start = min(len(self._items), len(line_ends))
+        if self._dirty_from is not None:
+            start = min(start, self._dirty_from)
+        patches = []
+        for task_id in self._dirty_ids:
+            index = self.get_index(task_id)
+            if index is None or index >= start:
+                continue
+            begin = line_ends[index - 1] if index else 0
+            data = (self._items[index].raw + "\n").encode("utf-8")
+            if len(data) == line_ends[index] - begin:
+                patches.append((index, begin, data))
+            else:
+                start = index
+        patches = [(begin, data) for index, begin, data in patches if index < start]
+        self.write_from(start, patches, line_ends[:start])
+        return True
+
+    def write_from(self, start, patches, line_ends):
+        # patch lines in place, then rewrite the file from line start
+        begin = line_ends[-1] if line_ends else 0
+        with open(self.file_path, "r+b" if start else "wb") as todotxt_file:
+            for offset, data in patches:
+                todotxt_file.seek(offset)
+                todotxt_file.write(data)
+            todotxt_file.seek(begin)
+            tail = [(t.raw + "\n").encode("utf-8") for t in self._items[start:]]
+            for data in tail:
+                begin += len(data)
+                line_ends.append(begin)
+            todotxt_file.write(b"".join(tail))
+            todotxt_file.truncate()
         self.file_m = os.path.getmtime(self.file_path)
-        with open(self.file_path, "r", encoding="utf-8") as todotxt_file:
-            self.set_text_items(todotxt_file.readlines())
+        self.set_saved(line_ends)
+
+    def start_writer(self, delay=0.2):
+        """Save in a background thread, bursts of saves are coalesced into one write."""
+        self.writer = SaveWorker(self.write_lines, delay)
 
-    def save(self):
-        with open(self.file_path, "w", encoding="utf-8") as todotxt_file:
-            for t in self._items:
-                todotxt_file.write(t.raw + "\n")
+    def stop_writer(self):
+        """Write pending changes and stop the background thread."""
+        writer, self.writer = self.writer, None
+        if writer:
+            writer.stop()
+
+    def write_lines(self, lines):
+        # called by the writer thread
+        write_atomic(self.file_path, "".join(line + "\n" for line in lines).encode("utf-8"))
         self.file_m = os.path.getmtime(self.file_path)
 
+    def get_file_paths(self):
+        """Return the paths of the files holding the tasks."""
+        return [self.file_path]
+
     def watch(self, handler):
-        path = self.file_path
+        # imported on first use, only the UI watches files
+        import watchdog.events
+        import watchdog.observers
+
+        paths = set(os.path.realpath(path) for path in self.get_file_paths())
 
         class Watcher(watchdog.events.FileSystemEventHandler):
             def on_modified(self, event):
-                if not event.is_directory and os.path.realpath(event.src_path) == os.path.realpath(
-                    path
-                ):
+                if not event.is_directory and os.path.realpath(event.src_path) in paths:
                     handler()
 
         self.observer = watchdog.observers.Observer()
-        self.observer.schedule(Watcher(), os.path.dirname(path))
+        for directory in sorted(set(os.path.dirname(path) for path in paths)):
+            self.observer.schedule(Watcher(), directory)
         self.observer.start()
 
     def stop_watch(self):
@@ -60,61 +279,252 @@ class Tasklist:
         self.observer = None
 
     def archive_tasks(self, filter):
-        with open(self.archive_path, "a", encoding="utf-8") as donetxt_file:
-            for t in filter(self._items):
-                donetxt_file.write(t.raw + "\n")
-                self._items.remove(t)
+        """Move the tasks returned by filter to the archive."""
+        tasks = filter(self._items)
+        if tasks:
+            self.append_archive(tasks)
+            archived = set(t.task_id for t in tasks)
+            keep = []
+            first = None
+            for i, t in enumerate(self._items):
+                if t.task_id in archived:
+                    if first is None:
+                        first = i
+                    self.detach(t)
+                else:
+                    keep.append(t)
+            self._items = keep
+            self.set_dirty_from(first)
+            self._positions = None
         self.save()
 
+    def complete_task(self, task):
+        """Mark task as done and move it to the archive, returns the next due date if it recurs.
+
+        A recurring task stays in the list with its next due date, a done copy is archived.
+        """
+        last = task.raw
+        rec = task.set_done()
+        if rec:
+            done = self.insert_new(-1, task.raw)
+            task.update(last)
+            task.set_due(rec)
+            task.set_creation_date(Util.get_today())
+            self.archive_task(done)
+        else:
+            self.archive_task(task)
+        return rec
+
+    def archive_task(self, task):
+        """Move a single task to the archive."""
+        self.append_archive([task])
+        self.delete_by_id(task.task_id)
+        self.save()
+
+    def append_archive(self, tasks):
+        with open(self.archive_path, "a+b") as donetxt_file:
+            # an index of the lines written now is enough to undo them
+            if not self.archive_index.is_valid(donetxt_file):
+                self.archive_index.reset(donetxt_file)
+            offset = donetxt_file.seek(0, os.SEEK_END)
+            data = b""
+            if offset > 0:
+                donetxt_file.seek(offset - 1)
+                if donetxt_file.read(1) != b"\n":
+                    data = b"\n"
+                    offset += 1
+            lines = [(t.raw + "\n").encode("utf-8") for t in tasks]
+            for t, line in zip(tasks, lines):
+                self.archive_index.append(offset, t.source)
+                offset += len(line)
+            donetxt_file.write(data + b"".join(lines))
+            donetxt_file.flush()
+            self.archive_index.update_stat(donetxt_file)
+
     def undo_archive(self):
+        """Move the last task from the archive back to the list."""
         with open(self.archive_path, "r+b") as file:
-
-            file.seek(0, os.SEEK_END)
-            pos = file.tell()
-
-            buf = b""
-            while pos > 0:
-                pos -= 1
-                file.seek(pos, os.SEEK_SET)
-                c = file.read(1)
-                if c == b"\n":
-                    if buf.strip() != b"":
-                        pos += 1
-                        break
-                    else:
-                        buf = b""
-                else:
-                    buf = c + buf
+            index = self.archive_index
+            if not index.is_valid(file):
+                index.reset(file)
+            pos = index.pop(file)
 
             res = None
-            text = buf.decode("utf-8").strip()
-            if text != "":
-                res = self.insert_new(-1, text)
+            if pos is not None:
+                file.seek(pos)
+                text = file.read().decode("utf-8").strip()
+                res = self.insert_archived(text, index.pop_source(pos))
                 self.save()
+            else:
+                pos = 0
 
             file.seek(pos, os.SEEK_SET)
             file.truncate()
+            file.flush()
+            index.update_stat(file)
             return res
 
+    def insert_archived(self, raw, source):
+        # source is the file the task was archived from or None if that is unknown
+        return self.insert_new(-1, raw)
+
     def set_text_items(self, text_items):
-        self._items = [Task(task, self.get_next_id()) for task in text_items if task.strip() != ""]
+        self.set_tasks(
+            [Task(task, self.get_next_id()) for task in text_items if task.strip() != ""]
+        )
+        self.set_saved(None)
+        self.set_dirty_from(0)
+
+    def set_tasks(self, tasks):
+        for t in self._items:
+            t.tasklist = None
+        self._items = tasks
+        for t in tasks:
+            t.tasklist = self
+        self._by_id = {t.task_id: t for t in tasks}
+        self._positions = None
+        self._indexes = {}
+        self.revision += 1
+
+    def update_text_items(self, text_items):
+        """Replace the items with text_items, keeping the tasks (and their ids) of unchanged lines.
+
+        Only added or changed lines are parsed, returns a Delta.
+        """
+        old = self._items
+        new = [line for line in (text.strip() for text in text_items) if line != ""]
+
+        # skip the common start and end
+        count = min(len(old), len(new))
+        start = 0
+        while start < count and old[start].raw == new[start]:
+            start += 1
+        end = 0
+        while end < count - start and old[-1 - end].raw == new[-1 - end]:
+            end += 1
+        old_changed = old[start : len(old) - end]
+        new_changed = new[start : len(new) - end]
+
+        # match moved lines
+        unused = {}
+        for t in reversed(old_changed):
+            unused.setdefault(t.raw, []).append(t)
+        changed = []
+        added = []
+        for i, raw in enumerate(new_changed):
+            tasks = unused.get(raw)
+            if tasks:
+                changed.append(tasks.pop())
+            else:
+                changed.append(None)
+                added.append(i)
+        unused_ids = set(t.task_id for tasks in unused.values() for t in tasks)
+        removed = [t for t in old_changed if t.task_id in unused_ids]
+
+        # the remaining lines were edited (paired in order), added or deleted
+        delta = Delta()
+        for i, t in zip(added, removed):
+            t.update(new_changed[i])
+            changed[i] = t
+            delta.updated.append(t.task_id)
+        for i in added[len(removed) :]:
+            t = Task(new_changed[i], self.get_next_id())
+            changed[i] = t
+            self.attach(t)
+            delta.inserted.append(t.task_id)
+        for t in removed[len(added) :]:
+            self.detach(t)
+            delta.deleted.append(t.task_id)
+
+        if delta or changed != old_changed:
+            self._items = old[:start] + changed + old[len(old) - end :]
+            self._positions = None
+            self.revision += 1
+            self.set_dirty_from(start)
+        return delta
+
+    def attach(self, task):
+        task.tasklist = self
+        self._by_id[task.task_id] = task
+        self.index_task(task)
+
+    def detach(self, task):
+        self.unindex_task(task)
+        del self._by_id[task.task_id]
+        task.tasklist = None
+
+    def get_task_index(self, name, create):
+        # indexes are built on first use and then kept up to date by index_task/unindex_task
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = create()
+            index.build(self._items)
+        return index
+
+    def before_update(self, task):
+        self._update_raw = task.raw
+        self.unindex_task(task)
+
+    def after_update(self, task):
+        self.index_task(task)
+        if task.raw != self._update_raw:
+            self._dirty_ids.add(task.task_id)
+
+    def index_task(self, task):
+        self.revision += 1
+        for index in self._indexes.values():
+            index.add(task)
+
+    def unindex_task(self, task):
+        self.revision += 1
+        for index in self._indexes.values():
+            index.remove(task)
 
     def get_index(self, task_id):
-        for i in range(len(self._items)):
-            if self._items[i].task_id == task_id:
-                return i
+        # task_id -> index, the positions before _positions_end are valid, the rest is
+        # rebuilt once after items were inserted or deleted there
+        if self._positions is None:
+            self._positions = {}
+            self._positions_end = 0
+        positions = self._positions
+        items = self._items
+        if self._positions_end < len(items):
+            index = positions.get(task_id)
+            if index is not None and index < self._positions_end:
+                return index
+            for index in range(self._positions_end, len(items)):
+                positions[items[index].task_id] = index
+            self._positions_end = len(items)
+        return positions.get(task_id)
+
+    def move_positions(self, index):
+        # the positions from index on have moved
+        if self._positions is not None:
+            self._positions_end = min(self._positions_end, index)
+
+    def get_by_id(self, task_id):
+        if self._source is not None:
+            self.reload()
+        return self._by_id.get(task_id)
 
     def insert_new(self, index, raw):
+        items = self._items  # load the file before taking an id
         task = Task(raw, self.get_next_id())
         if index == -1:
-            index = len(self._items)
-        self._items.insert(index, task)
+            index = len(items)
+        self.set_dirty_from(index)
+        self.move_positions(index)
+        items.insert(index, task)
+        self.attach(task)
         return task
 
     def delete_by_id(self, task_id):
         index = self.get_index(task_id)
         if index is not None:
-            del self._items[index]
+            self.set_dirty_from(index)
+            self.detach(self._items.pop(index))
+            del self._positions[task_id]
+            self.move_positions(index)
 
     def __iter__(self):
         self.index = -1
@@ -141,50 +551,120 @@ class Tasklist:
     def __repr__(self):
         return repr([i for i in self._items])
 
+    def get_memory_usage(self):
+        """Return (total bytes, bytes per task) of the task list, shared objects are counted once."""
+        seen = set()
+        size = sys.getsizeof(self._items) + sum(t.get_size(seen) for t in self._items)
+        return (size, size / len(self._items) if self._items else 0)
+
+    def get_context_index(self):
+        return self.get_task_index("contexts", lambda: TermIndex("contexts"))
+
+    def get_tag_index(self):
+        return self.get_task_index("tags", lambda: TermIndex("tags"))
+
     def all_contexts(self):
-        return sorted(set([context for task in self._items for context in task.contexts]))
+        return self.get_context_index().get_terms()
 
     def all_tags(self):
-        return sorted(set([tag for task in self._items for tag in task.tags]))
+        return self.get_tag_index().get_terms()
+
+    def get_context_counts(self):
+        return self.get_context_index().get_counts()
+
+    def get_tag_counts(self):
+        return self.get_tag_index().get_counts()
+
+    def get_context_ids(self, context):
+        return self.get_context_index().get_ids(context)
 
     def get_items(self):
         return self._items
 
-    def get_items_sorted(self, sort_by):
-        def due_prio(task):
-            res = task.due_date
-            if not res:
-                res = "9999"
-            res += task.raw
-            if not res:
-                res = "z"
-            if task.is_done() or task.is_deleted():
-                res = "z" + res
-            return res
-
-        def prio(task):
-            if task.is_done() or task.is_deleted():
-                return "z" + task.raw
+    # sort orders for get_items_sorted
+    sort_keys = {"due": _sort_key_due, "prio": _sort_key_prio, "created": _sort_key_created}
+
+    def get_sort_index(self, sort_by):
+        key = Tasklist.sort_keys[sort_by]
+        return self.get_task_index("sort-" + sort_by, lambda: SortedIndex(key))
+
+    def get_items_sorted(self, sort_by, context=None):
+        ids = self.get_context_ids(context) if context else None
+        return [self._by_id[task_id] for task_id in self.get_sort_index(sort_by).get_ids(ids)]
+
+    def get_counter(self, context=None, due_by=None):
+        """Return a TaskCounter of all tasks or of the tasks of a view.
+
+        A view has the tasks with context and, with due_by, those due by that ISO date or
+        without a due date (see filter_by_days). Only the counter of the last view is kept up
+        to date, asking for another view replaces it.
+        """
+        if context is None and due_by is None:
+            return self.get_task_index("counts", TaskCounter)
+
+        def accept(task):
+            if context is not None and context not in task.contexts:
+                return False
+            return due_by is None or not task.has_due() or task.is_due(due_by)
+
+        name = ("counts", context, due_by)
+        if name != self._view_counter:
+            self._indexes.pop(self._view_counter, None)
+            self._view_counter = name
+        return self.get_task_index(name, lambda: TaskCounter(accept))
+
+    def get_stats(self, today=None):
+        """Return the number of pending, done, due and overdue tasks."""
+        return self.get_counter().get_stats(today or Util.get_today_str())
+
+    def get_due_index(self):
+        return self.get_task_index("due", DueIndex)
+
+    def get_agenda(self, days, today=None):
+        """Return (date, task, projected) for the pending tasks due until today + days.
+
+        Recurring tasks are repeated on the due dates of their next occurrences (projected),
+        ordered by date. Only the tasks due until then are looked at.
+        """
+        if today is None:
+            today = Util.get_today()
+        end = today + datetime.timedelta(days=days)
+        heap = []
+        for task_id in self.get_due_index().get_ids_until(end.isoformat()):
+            dates = self._by_id[task_id].iter_due_dates(today)
+            heap.append((next(dates), task_id, 0, dates))
+        heapq.heapify(heap)
+
+        res = []
+        while heap:
+            date, task_id, n, dates = heap[0]
+            if date > end:
+                break
+            if n == 0 or date >= today:
+                res.append((date, self._by_id[task_id], n > 0))
+            date = next(dates, None)
+            if date is None:
+                heapq.heappop(heap)
             else:
-                return task.raw
-
-        def created(task):
-            res = task.creation_date
-            res += task.raw
-            if not res:
-                res = "z"
-            if task.is_done() or task.is_deleted():
-                res = "z" + res
-            return res
+                heapq.heapreplace(heap, (date, task_id, n + 1, dates))
+        return res
 
-        if sort_by == "due":
-            key = due_prio
-        elif sort_by == "prio":
-            key = prio
-        elif sort_by == "created":
-            key = created
+    def get_trigram_index(self):
+        return self.get_task_index("trigram", TrigramIndex)
 
-        return sorted(self._items, key=key)
+    def search_items(self, search_string, items=None):
+        """Return the items (default all) matching search_string.
+
+        With search_index set the candidates are looked up in the trigram index first.
+        """
+        if items is None:
+            items = self._items
+        search = Tasklist.prep_search(search_string)
+        if search and self.search_index:
+            ids = self.get_trigram_index().get_candidates(search.terms)
+            if ids is not None:
+                items = [t for t in items if t.task_id in ids]
+        return Tasklist.search(search, items)
 
     @staticmethod
     def filter_due(items, date):
@@ -211,28 +691,24 @@ class Tasklist:
         return [item for item in items if context in item.contexts]
 
     @staticmethod
-    def prep_search(search_string):
-        search_list = [x for x in [x.strip() for x in search_string.split(" ")] if x != ""]
+    def split_search(search_string):
+        return [x for x in [x.strip() for x in search_string.split(" ")] if x != ""]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def prep_search(search_string, fuzzy=False):
+        """Return a matcher for search_string (ranked with fuzzy) or None if it is empty."""
+        search_list = Tasklist.split_search(search_string)
         if not search_list:
             return None
-        exp1 = "".join(["(?=.*(" + re.escape(item) + "))" for item in search_list])
-        exp2 = "(" + "|".join([re.escape(item) for item in search_list]) + ")"
-        return (re.compile(exp1, re.IGNORECASE), re.compile(exp2, re.IGNORECASE))
+        return FuzzyMatcher(search_list) if fuzzy else TermMatcher(search_list)
 
     @staticmethod
     def search(search, items):
         if not search:
             return items
-        return [item for item in items if search[0].search(item.raw)]
+        return search.search(items)
 
     @staticmethod
     def get_search_highlight(search, text):
-        try:
-            color_list = search[1].split(text)
-            matches = search[0].search(text).groups()
-            for index, w in enumerate(color_list):
-                if w in matches:
-                    color_list[index] = ("search_match", w)
-            return color_list
-        except Exception:
-            return text
+        return search.get_highlight(text, "search_match")
@@ -0,0 +1,629 @@
+"""Benchmarks for todd.tasklib, run with python -m todd.tasklib.test.benchmark
+
+Usage:
+  benchmark [--json] [--sizes SIZES] [NAME ...]
+
+Options:
+  --json                Print the results as JSON (for comparing runs)
+  --sizes SIZES         Line counts for the suite benchmark [default: 1000,10000,100000]
+"""
+
+import configparser
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from docopt import docopt
+
+from todd.tasklib import Task, Tasklist, Workspace
+from todd.tasklib.search import SearchSession
+
+CONTEXTS = ["@home", "@work", "@phone", "@errands", "@computer", "@farm", "@weekend"]
+TAGS = ["+family", "+garden", "+todd", "+house", "+future", "+tax", "+car", "+music"]
+WORDS = "buy call fix plan write read clean email book order check pay send review".split()
+
+
+# results of all report calls, printed by --json (the table goes to stderr then)
+RESULTS = []
+JSON_OUTPUT = False
+
+
+def generate_lines(count, seed=0, deleted=0.0):
+    """Return count random todo.txt lines, the same for the same seed.
+
+    About 10% are done, 30% of the others have a priority, 40% have a due date and 5% recur.
+    deleted is the share of lines with a del: tag (with 0 the lines match older versions).
+    """
+    rnd = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        parts = []
+        if rnd.random() < 0.1:
+            parts.append("x 2020-{:02d}-{:02d}".format(rnd.randint(1, 12), rnd.randint(1, 28)))
+        elif rnd.random() < 0.3:
+            parts.append("({})".format(rnd.choice("ABCDEF")))
+        if rnd.random() < 0.7:
+            parts.append("2019-{:02d}-{:02d}".format(rnd.randint(1, 12), rnd.randint(1, 28)))
+        parts += rnd.sample(WORDS, rnd.randint(2, 6))
+        parts += rnd.sample(TAGS, rnd.randint(0, 2))
+        parts += rnd.sample(CONTEXTS, rnd.randint(0, 2))
+        if rnd.random() < 0.4:
+            parts.append("due:2021-{:02d}-{:02d}".format(rnd.randint(1, 12), rnd.randint(1, 28)))
+        if rnd.random() < 0.05:
+            parts.append(
+                "rec:{}{}{}".format(rnd.choice(["", "+"]), rnd.randint(1, 9), rnd.choice("dwmy"))
+            )
+        if deleted and rnd.random() < deleted:
+            parts.append("del:true")
+        lines.append(" ".join(parts))
+    return lines
+
+
+def generate_done_lines(count, seed=0):
+    """Return count random done.txt lines."""
+    lines = []
+    for i, line in enumerate(generate_lines(count, seed)):
+        if not line.startswith("x "):
+            line = "x 2020-{:02d}-{:02d} {}".format(
+                i % 12 + 1, i % 28 + 1, line[4:] if line[0] == "(" else line
+            )
+        lines.append(line)
+    return lines
+
+
+def write_lines(path, lines):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def timeit(fn, repeat=3, setup=None):
+    """Return the best time of repeat calls of fn, setup is called (untimed) before each."""
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, count, seconds):
+    RESULTS.append({"name": name, "lines": count, "seconds": seconds})
+    print(
+        "{:<30} {:>9} lines {:>10.1f} ms {:>12.0f} lines/s".format(
+            name, count, seconds * 1000, count / seconds
+        ),
+        file=sys.stderr if JSON_OUTPUT else sys.stdout,
+    )
+
+
+def report_memory(name, count, size):
+    RESULTS.append({"name": name, "lines": count, "bytes": size})
+    print(
+        "{:<30} {:>9} lines {:>10.1f} MB {:>12.0f} bytes/line".format(
+            name, count, size / 1e6, size / count
+        ),
+        file=sys.stderr if JSON_OUTPUT else sys.stdout,
+    )
+
+
+def bench_parse(count=50000):
+    lines = generate_lines(count)
+
+    def scan():
+        for line in lines:
+            Task.scan_priority(line)
+            Task.scan_contexts(line)
+            Task.scan_tags(line)
+            Task.scan_done_date(line)
+            Task.scan_creation_date(line)
+            Task.scan_due_date(line)
+            Task.scan_rec_int(line)
+
+    def tokenize():
+        for line in lines:
+            Task.tokenize(line)
+
+    report("parse: scan_*", count, timeit(scan))
+    report("parse: tokenize", count, timeit(tokenize))
+
+
+def bench_memory(count=50000):
+    tasklist = Tasklist(generate_lines(count))
+    report_memory("memory", count, tasklist.get_memory_usage()[0])
+
+
+def bench_sort(count=50000):
+    tasklist = Tasklist(generate_lines(count))
+    items = tasklist.get_items()
+
+    def full_sort():
+        for sort_by, key in Tasklist.sort_keys.items():
+            sorted(items, key=key)
+
+    def maintained():
+        for sort_by in Tasklist.sort_keys:
+            tasklist.get_items_sorted(sort_by)
+
+    def edit_one():
+        items[count // 2].set_priority("A")
+        items[count // 2].set_priority("")
+        maintained()
+
+    report("sort: sorted()", count, timeit(full_sort))
+    report("sort: build views", count, timeit(maintained, repeat=1))
+    report("sort: views", count, timeit(maintained))
+    report("sort: views after edit", count, timeit(edit_one))
+
+
+def bench_save(count=50000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "todo.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(generate_lines(count)) + "\n")
+        tasklist = Tasklist.open_file(path)
+        task = tasklist[count // 2]
+
+        def full():
+            task.set_priority("A" if task.priority != "A" else "B")
+            tasklist.save(full=True)
+
+        def same_length():
+            task.set_priority("A" if task.priority != "A" else "B")
+            tasklist.save()
+
+        def tail():
+            task.update(task.raw + " x" if not task.raw.endswith(" x") else task.raw[:-2])
+            tasklist.save()
+
+        def append():
+            tasklist.insert_new(-1, "Call the plumber @phone")
+            tasklist.save()
+
+        report("save: full rewrite", count, timeit(full))
+        report("save: unchanged", count, timeit(tasklist.save))
+        report("save: same length edit", count, timeit(same_length))
+        report("save: edit in the middle", count, timeit(tail))
+        report("save: append", count, timeit(append))
+
+        tasklist.start_writer()
+        report("save: background submit", count, timeit(full))
+        tasklist.stop_writer()
+
+
+def bench_reload(count=50000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "todo.txt")
+        lines = generate_lines(count)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        tasklist = Tasklist.open_file(path)
+        tasklist.get_items_sorted("due")
+
+        def edit_line():
+            line = lines[count // 2]
+            lines[count // 2] = line[:-2] if line.endswith(" x") else line + " x"
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+
+        def full():
+            edit_line()
+            tasklist.set_text_items(lines)
+            tasklist.get_items_sorted("due")
+
+        def incremental():
+            edit_line()
+            tasklist.reload()
+            tasklist.get_items_sorted("due")
+
+        report("reload: set_text_items", count, timeit(full))
+        report("reload: incremental", count, timeit(incremental))
+
+
+def bench_load(count=1000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "todo.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(generate_lines(count)) + "\n")
+
+        def eager():
+            with open(path, "r", encoding="utf-8") as file:
+                return Tasklist(file.readlines())
+
+        def lazy():
+            return Tasklist.open_file(path)
+
+        def peak(fn):
+            tracemalloc.start()
+            fn()
+            res = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return res
+
+        report("load: readlines + parse", count, timeit(eager, repeat=1))
+        report("load: open_file", count, timeit(lazy))
+        report("load: open_file + first use", count, timeit(lambda: len(lazy()), repeat=1))
+        report(
+            "load: open_file + sort",
+            count,
+            timeit(lambda: lazy().get_items_sorted("due"), repeat=1),
+        )
+        report_memory("load: peak eager", count, peak(eager))
+        report_memory("load: peak first use", count, peak(lambda: len(lazy())))
+
+
+def bench_undo(count=100000, undos=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "todo.txt")
+        archive_path = os.path.join(tmp, "done.txt")
+        lines = generate_lines(count)
+
+        def write_archive():
+            with open(archive_path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n\n")
+            open(path, "w").close()
+            return Tasklist.open_file(path)
+
+        def bytewise():
+            # the previous undo_archive, one seek and read per byte
+            with open(archive_path, "r+b") as file:
+                pos = file.seek(0, os.SEEK_END)
+                buf = b""
+                while pos > 0:
+                    pos -= 1
+                    file.seek(pos, os.SEEK_SET)
+                    c = file.read(1)
+                    if c == b"\n":
+                        if buf.strip() != b"":
+                            pos += 1
+                            break
+                        else:
+                            buf = b""
+                    else:
+                        buf = c + buf
+                file.seek(pos, os.SEEK_SET)
+                file.truncate()
+
+        write_archive()
+        report("undo: bytewise", undos, timeit(lambda: [bytewise() for _ in range(undos)], 1))
+        tasklist = write_archive()
+        report(
+            "undo: undo_archive + save",
+            undos,
+            timeit(lambda: [tasklist.undo_archive() for _ in range(undos)], 1),
+        )
+
+
+def bench_archive(count=30000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "todo.txt")
+        lines = generate_lines(count)
+
+        def open_todo():
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+            return Tasklist.open_file(path)
+
+        def remove_each(tasklist):
+            # the previous archive_tasks, one list.remove per task
+            items = tasklist.get_items()
+            with open(tasklist.archive_path, "a", encoding="utf-8") as file:
+                for t in Tasklist.filter_done_or_del(items):
+                    file.write(t.raw + "\n")
+                    items.remove(t)
+            tasklist.save(full=True)
+
+        tasklist = open_todo()
+        report("archive: list.remove", count, timeit(lambda: remove_each(tasklist), 1))
+        tasklist = open_todo()
+        report(
+            "archive: archive_tasks",
+            count,
+            timeit(lambda: tasklist.archive_tasks(Tasklist.filter_done_or_del), 1),
+        )
+
+        def archive_one():
+            task = tasklist[len(tasklist) // 2]
+            task.set_done()
+            tasklist.archive_task(task)
+
+        report("archive: archive_task", 1, timeit(archive_one))
+
+
+def bench_typing(count=100000, query="pay call @home"):
+    tasklist = Tasklist(generate_lines(count))
+    items = tasklist.get_items()
+    queries = [query[:i] for i in range(1, len(query) + 1)]
+
+    def full():
+        for text in queries:
+            Tasklist.search(Tasklist.prep_search(text), items)
+
+    def session():
+        search_session = SearchSession()
+        for text in queries:
+            search_session.search(tasklist.revision, tasklist.get_items, text)
+
+    report("typing: full scan", count, timeit(full) / len(queries))
+    report("typing: search session", count, timeit(session) / len(queries))
+
+
+def bench_trigram(counts=(10000, 100000, 1000000), queries=("plumber", "call @home", "+tax pay")):
+    for count in counts:
+        tasklist = Tasklist(generate_lines(count))
+
+        def search():
+            for query in queries:
+                tasklist.search_items(query)
+
+        report("trigram: linear scan", count, timeit(search, 1) / len(queries))
+        tasklist.search_index = True
+        report("trigram: build index", count, timeit(tasklist.get_trigram_index, 1))
+        report("trigram: indexed", count, timeit(search, 1) / len(queries))
+        task = tasklist[count // 2]
+        report("trigram: update", 1, timeit(lambda: task.update(task.raw + " plumber"), 1))
+
+
+def bench_matcher(count=50000, query="pay call @home"):
+    tasklist = Tasklist(generate_lines(count))
+    items = tasklist.get_items()
+    terms = query.split()
+
+    def lookahead():
+        # the previous prep_search, search and get_search_highlight
+        exp1 = "".join(["(?=.*(" + re.escape(item) + "))" for item in terms])
+        exp2 = "(" + "|".join([re.escape(item) for item in terms]) + ")"
+        regex1, regex2 = re.compile(exp1, re.IGNORECASE), re.compile(exp2, re.IGNORECASE)
+        for item in [item for item in items if regex1.search(item.raw)]:
+            color_list = regex2.split(item.raw)
+            matches = regex1.search(item.raw).groups()
+            for index, w in enumerate(color_list):
+                if w in matches:
+                    color_list[index] = ("search_match", w)
+
+    def matcher():
+        search = Tasklist.prep_search(query)
+        for item in Tasklist.search(search, items):
+            Tasklist.get_search_highlight(search, item.raw)
+
+    report("matcher: lookahead regex", count, timeit(lookahead))
+    report("matcher: TermMatcher", count, timeit(matcher))
+
+
+def bench_agenda(count=100000, days=14):
+    tasklist = Tasklist(generate_lines(count))
+    today = datetime.date(2021, 1, 1)
+    end = (today + datetime.timedelta(days=days)).isoformat()
+
+    def scan():
+        # every pending task with a due date, recurring ones expanded
+        res = []
+        for task in tasklist:
+            if task.due_date and not task.is_done() and task.due_date <= end:
+                for date in task.iter_due_dates(today):
+                    if date.isoformat() > end:
+                        break
+                    res.append((date, task))
+        return sorted(res, key=lambda entry: (entry[0], entry[1].task_id))
+
+    report("agenda: scan", count, timeit(scan))
+    report("agenda: build index", count, timeit(lambda: tasklist.get_agenda(days, today), 1))
+    report("agenda: get_agenda", count, timeit(lambda: tasklist.get_agenda(days, today)))
+
+
+def bench_workspace(files=8, count=100000):
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(files):
+            with open(
+                os.path.join(tmp, "project{}.todo.txt".format(i)), "w", encoding="utf-8"
+            ) as file:
+                file.write("\n".join(generate_lines(count, seed=i)) + "\n")
+        workspace = Workspace.open_files([tmp])
+        paths = workspace.file_paths
+
+        def sequential():
+            return [len(Tasklist.open_file(path)) for path in paths]
+
+        def edit():
+            task = workspace[count // 2]
+            task.update(task.raw[:-2] if task.raw.endswith(" x") else task.raw + " x")
+            workspace.save()
+
+        report("workspace: open_file each", files * count, timeit(sequential, repeat=1))
+        report(
+            "workspace: load",
+            files * count,
+            timeit(lambda: len(Workspace.open_files([tmp])), repeat=1),
+        )
+        report("workspace: edit + save", files * count, timeit(edit))
+
+
+def bench_cache(count=100000, changed=10):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "todo.txt")
+        lines = generate_lines(count)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+        def start(parse_cache):
+            tasklist = Tasklist.open_file(path)
+            tasklist.parse_cache = parse_cache
+            tasklist.get_items_sorted("due")
+            return tasklist
+
+        report("cache: open + sort", count, timeit(lambda: start(False)))
+        tasklist = start(True)
+        report("cache: save_parse_cache", count, timeit(tasklist.save_parse_cache))
+        report("cache: open + sort, cached", count, timeit(lambda: start(True)))
+        for i in range(changed):
+            lines[i * count // changed] += " +changed"
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        report("cache: {} lines changed".format(changed), count, timeit(lambda: start(True)))
+
+
+def bench_startup(count=1000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "todo.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(generate_lines(count)) + "\n")
+
+        def run(*args):
+            return lambda: subprocess.run(
+                [sys.executable] + list(args), check=True, stdout=subprocess.DEVNULL
+            )
+
+        report("startup: python", count, timeit(run("-c", "pass")))
+        report("startup: import todd.main", count, timeit(run("-c", "import todd.main")))
+        report("startup: import todd.taskui", count, timeit(run("-c", "import todd.taskui")))
+        report("startup: todd list", count, timeit(run("-m", "todd.main", "-f", path, "list")))
+
+
+def bench_suite(counts=(1000, 10000, 100000)):
+    """Time the main operations on generated todo.txt and done.txt files of each size."""
+    from todd.taskui import ColorScheme, KeyBindings, MainUI
+
+    today = datetime.date(2021, 1, 1)
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "todo.txt")
+            done_path = os.path.join(tmp, "done.txt")
+            lines = generate_lines(count, deleted=0.02)
+            done_lines = generate_done_lines(count, seed=1)
+            state = {}
+
+            def fresh():
+                # files as generated and a loaded, parsed task list
+                write_lines(path, lines)
+                write_lines(done_path, done_lines)
+                tasklist = state["tasklist"] = Tasklist.open_file(path, done_path)
+                Tasklist.filter_done_or_del(tasklist.get_items())
+                return tasklist
+
+            write_lines(path, lines)
+            report("suite: open_file + load", count, timeit(lambda: len(Tasklist.open_file(path))))
+
+            tasklist = fresh()
+            edited = list(lines)
+
+            def edit_file():
+                line = edited[count // 2]
+                edited[count // 2] = line[:-2] if line.endswith(" x") else line + " x"
+                write_lines(path, edited)
+
+            report("suite: reload", count, timeit(tasklist.reload, setup=edit_file))
+
+            tasklist = fresh()
+            items = tasklist.get_items()
+            for sort_by in Tasklist.sort_keys:
+
+                def reset():
+                    tasklist.set_tasks(list(items))
+
+                report(
+                    "suite: sort " + sort_by,
+                    count,
+                    timeit(lambda: tasklist.get_items_sorted(sort_by), setup=reset),
+                )
+                report(
+                    "suite: sort {} (index)".format(sort_by),
+                    count,
+                    timeit(lambda: tasklist.get_items_sorted(sort_by)),
+                )
+
+            filters = [
+                ("filter_pending", lambda: Tasklist.filter_pending(items)),
+                ("filter_done_or_del", lambda: Tasklist.filter_done_or_del(items)),
+                ("filter_due", lambda: Tasklist.filter_due(items, today.isoformat())),
+                ("filter_by_days", lambda: Tasklist.filter_by_days(items, 7)),
+                ("filter_context", lambda: Tasklist.filter_context(items, "@home")),
+                ("search", lambda: Tasklist.search(Tasklist.prep_search("pay call"), items)),
+                (
+                    "search fuzzy",
+                    lambda: Tasklist.search(Tasklist.prep_search("pycl", True), items),
+                ),
+            ]
+            for text, fn in filters:
+                report("suite: " + text, count, timeit(fn))
+
+            task = tasklist[count // 2]
+
+            def edit():
+                task.update(task.raw[:-2] if task.raw.endswith(" x") else task.raw + " x")
+
+            report("suite: save", count, timeit(tasklist.save, setup=edit))
+            report("suite: save full", count, timeit(lambda: tasklist.save(full=True)))
+
+            report(
+                "suite: archive_tasks",
+                count,
+                timeit(
+                    lambda: state["tasklist"].archive_tasks(Tasklist.filter_done_or_del),
+                    setup=fresh,
+                ),
+            )
+
+            def undo_all():
+                for _ in range(100):
+                    state["tasklist"].undo_archive()
+
+            report("suite: undo_archive x100", count, timeit(undo_all, setup=fresh))
+
+            tasklist = fresh()
+            ui = MainUI(
+                tasklist, KeyBindings({}), ColorScheme("default", configparser.ConfigParser())
+            )
+            report("suite: fill_listbox first", count, timeit(ui.fill_listbox, repeat=1))
+            report("suite: fill_listbox", count, timeit(ui.fill_listbox))
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "memory": bench_memory,
+    "sort": bench_sort,
+    "save": bench_save,
+    "reload": bench_reload,
+    "load": bench_load,
+    "undo": bench_undo,
+    "archive": bench_archive,
+    "typing": bench_typing,
+    "trigram": bench_trigram,
+    "matcher": bench_matcher,
+    "agenda": bench_agenda,
+    "workspace": bench_workspace,
+    "startup": bench_startup,
+    "cache": bench_cache,
+    "suite": bench_suite,
+}
+
+
+def main(argv):
+    global JSON_OUTPUT
+    arguments = docopt(__doc__, argv)
+    JSON_OUTPUT = arguments["--json"]
+    for name in arguments["NAME"] or BENCHMARKS:
+        if name == "suite":
+            bench_suite([int(size) for size in arguments["--sizes"].split(",")])
+        else:
+            BENCHMARKS[name]()
+    if JSON_OUTPUT:
+        json.dump(
+            {"python": platform.python_version(), "results": RESULTS},
+            sys.stdout,
+            indent=1,
+        )
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,32 @@
+import json
+from todd.tasklib import Task
+from todd.tasklib.test import benchmark
+
+
+def test_generate_lines():
+    lines = benchmark.generate_lines(2000, seed=7, deleted=0.05)
+    assert lines == benchmark.generate_lines(2000, seed=7, deleted=0.05)
+    assert lines != benchmark.generate_lines(2000, seed=8, deleted=0.05)
+    # no deleted lines by default
+    assert "del:true" not in " ".join(benchmark.generate_lines(2000, seed=7))
+
+    tasks = [Task(line, i) for i, line in enumerate(lines)]
+    assert 100 < sum(1 for t in tasks if t.is_done()) < 300
+    assert sum(1 for t in tasks if t.is_deleted()) > 50
+    assert sum(1 for t in tasks if t.priority) > 300
+    assert sum(1 for t in tasks if t.due_date) > 600
+    assert sum(1 for t in tasks if t.rec_int) > 50
+    assert sum(1 for t in tasks if t.contexts) > 600
+    assert sum(1 for t in tasks if t.tags) > 600
+
+    done = benchmark.generate_done_lines(500)
+    assert all(Task(line, 0).is_done() and not Task(line, 0).priority for line in done)
+
+
+def test_suite_json(capsys, monkeypatch):
+    monkeypatch.setattr(benchmark, "RESULTS", [])
+    benchmark.main(["--json", "--sizes", "200", "suite"])
+    res = json.loads(capsys.readouterr().out)
+    names = [r["name"] for r in res["results"]]
+    assert "suite: archive_tasks" in names and "suite: fill_listbox" in names
+    assert all(r["lines"] == 200 and r["seconds"] >= 0 for r in res["results"])
@@ -0,0 +1,139 @@
+import marshal
+import pytest
+import sys
+from todd.tasklib import Task, Tasklist, Workspace
+from todd.tasklib.cache import ParseCache
+from todd.main import main
+from todd.tasklib.test.benchmark import generate_lines
+
+
+def open_tasklist(path):
+    tasklist = Tasklist.open_file(str(path))
+    tasklist.parse_cache = True
+    return tasklist
+
+
+@pytest.fixture
+def count_parse(monkeypatch):
+    parsed = []
+    tokenize = Task.tokenize
+
+    def counting(text):
+        parsed.append(text)
+        return tokenize(text)
+
+    monkeypatch.setattr(Task, "tokenize", staticmethod(counting))
+    return parsed
+
+
+def test_parse_cache(tmp_path, count_parse):
+    path = tmp_path / "todo.txt"
+    lines = generate_lines(500, seed=3)
+    path.write_text("\n".join(lines) + "\n")
+    tasklist = open_tasklist(path)
+    expected = [t.get_fields() for t in tasklist.get_items_sorted("due")]
+    assert tasklist.save_parse_cache()
+    assert (tmp_path / ".todo.txt.cache").exists()
+
+    del count_parse[:]
+    tasklist = open_tasklist(path)
+    assert [t.get_fields() for t in tasklist.get_items_sorted("due")] == expected
+    assert count_parse == []
+
+    # only changed lines are parsed
+    lines[10] = "(A) Changed line @home due:2021-01-01"
+    lines.insert(20, "New line +tax")
+    path.write_text("\n".join(lines) + "\n")
+    tasklist = open_tasklist(path)
+    tasklist.get_items_sorted("due")
+    fields = [t.get_fields() for t in tasklist]
+    assert sorted(count_parse) == sorted(lines[i] for i in (10, 20))
+    assert tasklist[10].due_date == "2021-01-01"
+    assert tasklist[20].tags == ("+tax",)
+    assert fields == [Task(raw, 0).get_fields() for raw in lines]
+
+
+def test_parse_cache_skips_unparsed(tmp_path, count_parse):
+    path = tmp_path / "todo.txt"
+    path.write_text("Call mom @phone\nBuy milk\n")
+    tasklist = open_tasklist(path)
+    assert tasklist[0].contexts == ("@phone",)
+    tasklist.save_parse_cache()
+    assert ParseCache(str(path)).load(["Call mom @phone", "Buy milk"]) == [
+        ("", ("@phone",), (), "", "", "", ""),
+        None,
+    ]
+
+
+def test_parse_cache_invalid(tmp_path):
+    path = tmp_path / "todo.txt"
+    path.write_text("Call mom @phone\n")
+    (tmp_path / ".todo.txt.cache").write_bytes(b"garbage")
+    tasklist = open_tasklist(path)
+    assert tasklist[0].contexts == ("@phone",)
+    tasklist[0].update("Call mom")
+    assert not tasklist.save_parse_cache()  # not saved yet
+    tasklist.save()
+    assert tasklist.save_parse_cache()
+    assert ParseCache(str(path)).load(["Call mom"]) == [("", (), (), "", "", "", "")]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        (ParseCache.VERSION, ["Call mom @phone"], [("", ("@phone",), ())]),
+        (ParseCache.VERSION, ["Call mom @phone"], []),
+        (ParseCache.VERSION, ["Call mom @phone"], [None]),
+        (ParseCache.VERSION, ["Call mom @phone"], [("", "@phone", (), "", "", "", "")]),
+        (ParseCache.VERSION, [["Call mom @phone"]], [("", ("@phone",), (), "", "", "", "")]),
+        (ParseCache.VERSION, "Call mom @phone", ["", ("@phone",), (), "", "", "", ""]),
+        (ParseCache.VERSION + 1, ["Call mom @phone"], [("", ("@phone",), (), "", "", "", "")]),
+        (ParseCache.VERSION, ["Call mom @phone"]),
+    ],
+)
+def test_parse_cache_malformed(tmp_path, data):
+    path = tmp_path / "todo.txt"
+    path.write_text("Call mom @phone\nBuy milk\n")
+    (tmp_path / ".todo.txt.cache").write_bytes(marshal.dumps(data))
+    assert ParseCache(str(path)).load(["Call mom @phone", "Buy milk"]) is None
+    assert ParseCache(str(path)).load(["Call mom @phone"]) is None
+    tasklist = open_tasklist(path)
+    assert [t.contexts for t in tasklist] == [("@phone",), ()]
+
+
+def test_parse_cache_main(tmp_path, count_parse, monkeypatch, capsys):
+    # the setting has to be applied before the file is loaded
+    path = tmp_path / "todo.txt"
+    path.write_text("\n".join(generate_lines(300, seed=3)) + "\n")
+    config = tmp_path / "toddrc"
+    config.write_text("[settings]\nparse-cache = True\n")
+    argv = ["todd", "--config", str(config), "--file", str(path), "list"]
+    monkeypatch.setattr(sys, "argv", argv)
+    for parsed in (300, 0):
+        del count_parse[:]
+        with pytest.raises(SystemExit) as e:
+            main()
+        assert e.value.code == 0
+        assert len(count_parse) == parsed
+        assert (tmp_path / ".todo.txt.cache").exists()
+    assert capsys.readouterr().out
+
+
+def test_parse_cache_workspace(tmp_path, count_parse):
+    (tmp_path / "home.todo.txt").write_text("Call mom @phone\n")
+    (tmp_path / "work.todo.txt").write_text("(A) Fix bug +todd\n")
+    workspace = Workspace.open_files([str(tmp_path)])
+    workspace.parse_cache = True
+    expected = [t.get_fields() for t in workspace]
+    assert workspace.save_parse_cache()
+    assert (tmp_path / ".work.todo.txt.cache").exists()
+
+    del count_parse[:]
+    workspace = Workspace.open_files([str(tmp_path)])
+    workspace.parse_cache = True
+    assert [t.get_fields() for t in workspace] == expected
+    assert [t.source for t in workspace] == [
+        str(tmp_path / "home.todo.txt"),
+        str(tmp_path / "work.todo.txt"),
+    ]
+    assert count_parse == []
@@ -0,0 +1,114 @@
+import os
+import pytest
+import subprocess
+import sys
+import todd
+from todd import cli
+from todd.main import main
+from todd.tasklib import Tasklist, Util
+
+
+def open_tasklist(tmp_path, text):
+    path = tmp_path / "todo.txt"
+    path.write_text(text)
+    return (Tasklist.open_file(str(path)), path)
+
+
+def test_add(tmp_path):
+    tasklist, path = open_tasklist(tmp_path, "Call mom\n")
+    assert cli.add_task(tasklist, "Buy milk due:0") == [
+        "   2 {0} Buy milk due:{0}".format(Util.get_today_str())
+    ]
+    assert path.read_text().splitlines()[1] == tasklist[1].raw
+    with pytest.raises(cli.CommandError):
+        cli.add_task(tasklist, " ")
+
+
+def test_list(tmp_path):
+    tasklist, _ = open_tasklist(
+        tmp_path,
+        "(B) Pay bills @home due:2021-02-01\n"
+        "x 2021-01-01 Paid @home\n"
+        "(A) Call plumber @home @phone\n"
+        "Buy milk @shop due:2021-01-01\n",
+    )
+    assert cli.list_tasks(tasklist, []) == [
+        "   4 Buy milk @shop due:2021-01-01",
+        "   1 (B) Pay bills @home due:2021-02-01",
+        "   3 (A) Call plumber @home @phone",
+    ]
+    assert cli.list_tasks(tasklist, ["@home"], "prio") == [
+        "   3 (A) Call plumber @home @phone",
+        "   1 (B) Pay bills @home due:2021-02-01",
+    ]
+    assert cli.list_tasks(tasklist, ["@home", "@phone"]) == ["   3 (A) Call plumber @home @phone"]
+    assert cli.list_tasks(tasklist, ["@home", "pa"], show_all=True) == [
+        "   1 (B) Pay bills @home due:2021-02-01",
+        "   2 x 2021-01-01 Paid @home",
+    ]
+    with pytest.raises(cli.CommandError):
+        cli.list_tasks(tasklist, [], "name")
+
+
+def test_done(tmp_path):
+    tasklist, path = open_tasklist(tmp_path, "Call mom\nWater plants due:2021-01-01 rec:+1w\n")
+    lines = cli.complete_tasks(tasklist, ["1", "2"])
+    assert lines == [
+        "Done: Call mom",
+        "Done: Water plants due:2021-01-01 rec:+1w",
+        "   2 {0} Water plants due:2021-01-08 rec:+1w".format(Util.get_today_str()),
+    ]
+    assert path.read_text() == tasklist[0].raw + "\n"
+    done = (tmp_path / "done.txt").read_text().splitlines()
+    assert [line[13:] for line in done] == ["Call mom", "Water plants due:2021-01-01 rec:+1w"]
+    with pytest.raises(cli.CommandError):
+        cli.complete_tasks(tasklist, ["1"])
+
+
+def test_done_repeated_ids(tmp_path):
+    tasklist, path = open_tasklist(tmp_path, "Call mom\nWater plants due:2021-01-01 rec:+1w\n")
+    res = cli.complete_tasks(tasklist, ["1", "2", "01", "2"])
+    assert res[0] == "Done: Call mom" and len(res) == 3
+    assert [line[13:] for line in (tmp_path / "done.txt").read_text().splitlines()] == [
+        "Call mom",
+        "Water plants due:2021-01-01 rec:+1w",
+    ]
+    assert tasklist[0].due_date == "2021-01-08"  # rescheduled once
+    assert path.read_text() == tasklist[0].raw + "\n"
+
+
+def test_due(tmp_path):
+    tasklist, path = open_tasklist(tmp_path, "Call mom due:2021-01-01\nBuy milk\n")
+    assert cli.set_due(tasklist, "1", "+3d") == ["   1 Call mom due:2021-01-04"]
+    assert cli.set_due(tasklist, "2", "2021-05-01") == ["   2 Buy milk due:2021-05-01"]
+    assert path.read_text() == "Call mom due:2021-01-04\nBuy milk due:2021-05-01\n"
+    with pytest.raises(cli.CommandError):
+        cli.set_due(tasklist, "x", "1")
+    for text in ("garbage", "+3x", "2021-02-30", ""):
+        with pytest.raises(cli.CommandError):
+            cli.set_due(tasklist, "1", text)
+    assert path.read_text() == "Call mom due:2021-01-04\nBuy milk due:2021-05-01\n"
+
+
+def test_unreadable_file(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "todo.txt"
+    path.write_bytes(b"Call mom\n\xff\xfe\n")
+    monkeypatch.setattr(sys, "argv", ["todd", "-f", str(path), "list"])
+    with pytest.raises(SystemExit) as e:
+        main()
+    assert e.value.code == 1
+    assert capsys.readouterr().err.startswith("ERROR: unable to open " + str(path))
+
+
+def test_commands_do_not_import_the_ui(tmp_path):
+    path = tmp_path / "todo.txt"
+    path.write_text("Call mom\n")
+    code = (
+        "import sys; from todd.main import main; sys.argv = ['todd', '-f', {0!r}, 'list'];\n"
+        "try: main()\n"
+        "except SystemExit: assert 'urwid' not in sys.modules and 'watchdog' not in sys.modules"
+    ).format(str(path))
+    root = os.path.dirname(os.path.dirname(todd.__file__))
+    res = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True)
+    assert res.returncode == 0, res.stderr
+    assert res.stdout == "   1 Call mom\n"
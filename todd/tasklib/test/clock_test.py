@@ -0,0 +1,35 @@
+import datetime
+from todd.tasklib import Task, Util
+from todd.tasklib.clock import Clock
+import todd.tasklib.util
+
+
+def test_util_today_not_frozen(monkeypatch):
+    monkeypatch.setattr(todd.tasklib.util, "_get_today", lambda: datetime.date(2030, 1, 1))
+    assert Util.get_date_name(datetime.date(2030, 1, 2)) == "tomorrow"
+    assert Util.mod_date_by(None, "to") == datetime.date(2030, 1, 2)
+    assert Util.mod_date_by(None, "mo") == datetime.date(2030, 1, 7)
+    assert Util.mod_date_by(datetime.date(2030, 1, 5), "2d") == datetime.date(2030, 1, 7)
+
+
+def test_clock():
+    today = [datetime.date(2030, 1, 1)]
+    clock = Clock(lambda: today[0])
+    assert (clock.today_str, clock.next_monday_str) == ("2030-01-01", "2030-01-07")
+    task = Task("Pay the rent due:2030-01-02", 1)
+    assert clock.get_date_name(task.due_date) == "tomorrow"
+    assert clock.get_date_name("") == "later"
+    assert clock.get_status(task) == ("todo", 1)
+    assert clock.get_status(Task("x 2030-01-01 Pay the rent due:2030-01-02", 2))[0] == "done"
+    assert not clock.update()
+
+    today[0] = datetime.date(2030, 1, 2)
+    assert clock.update()
+    assert clock.get_date_name(task.due_date) == "today"
+    assert clock.get_status(task) == ("due", 0)
+
+
+def test_clock_seconds_to_midnight():
+    clock = Clock()
+    now = datetime.datetime(2030, 1, 1, 23, 59, 30)
+    assert clock.get_seconds_to_midnight(now) == 30
@@ -0,0 +1,72 @@
+from todd.tasklib import Task
+from todd.taskui import TaskWalker, WidgetCache
+
+
+def make_walker(raws, dividers=(), due_dates=None):
+    walker = TaskWalker(lambda task, due_date: (task.raw, due_date), lambda text: text)
+    walker.set_rows([Task(raw, i) for i, raw in enumerate(raws)], dividers, due_dates)
+    return walker
+
+
+def test_task_walker_rows():
+    walker = make_walker(["a", "b", "c"], [(0, "Today"), (2, "Later")], ["d0", "d1", "d2"])
+    assert len(walker) == 5
+    assert [walker[pos] for pos in range(len(walker))] == [
+        "Today",
+        ("a", "d0"),
+        ("b", "d1"),
+        "Later",
+        ("c", "d2"),
+    ]
+    assert walker.get_next(4) == (None, None)
+    assert walker.get_prev(1) == ("Today", 0)
+
+
+def test_task_walker_get_task_position():
+    walker = make_walker(["a", "b", "c"], [(0, "Today"), (2, "Later")])
+    assert [walker.get_task_position(i) for i in range(3)] == [1, 2, 4]
+    assert walker.get_task_position(7) is None
+
+    walker.insert_task(2, Task("new", 7))
+    assert [walker.get_task_position(i) for i in (0, 1, 7, 2)] == [1, 2, 3, 5]
+    assert walker[4] == "Later"
+
+    walker.set_rows([Task("b", 1)])
+    assert walker.get_task_position(1) == 0
+    assert walker.get_task_position(0) is None
+
+
+def test_task_walker_repeated_task():
+    # the agenda shows a recurring task once for each of its dates
+    task = Task("Water plants rec:1d", 0)
+    walker = TaskWalker(lambda task, due_date: due_date, lambda text: text)
+    walker.set_rows([Task("a", 1), task, task], [(1, "Today"), (2, "Tomorrow")], [None, "d1", "d2"])
+    assert walker.get_task_position(0) == 2
+    assert walker[4] == "d2"
+
+
+def test_widget_cache_eviction():
+    cache = WidgetCache(size=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") == "A"  # a is now the most recently used
+    cache.put("d", "D")
+    assert list(cache.widgets) == ["c", "a", "d"]
+    cache.put("c", "C2")
+    cache.put("e", "E")
+    assert list(cache.widgets) == ["d", "c", "e"]
+    assert cache.get("a") is None and cache.get("c") == "C2"
+
+
+def test_widget_cache_valid_and_stats():
+    cache = WidgetCache(size=10)
+    assert cache.get_stats() == {"size": 0, "hits": 0, "misses": 0, "hit_rate": 0}
+    cache.put(1, "old")
+    assert cache.get(1, lambda widget: widget == "new") is None
+    assert 1 not in cache.widgets
+    cache.put(1, "new")
+    assert cache.get(1, lambda widget: widget == "new") == "new"
+    assert cache.get(2) is None
+    assert cache.get_stats() == {"size": 1, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
+    cache.clear()
+    assert cache.get_stats()["size"] == 0
@@ -0,0 +1,102 @@
+import io
+from todd.tasklib import Tasklist
+from todd.tasklib.loader import TailIndex, read_lines, read_lines_reverse
+
+
+def test_read_lines(tmp_path):
+    path = tmp_path / "todo.txt"
+    path.write_bytes(b"a\nbb\n\nc")
+    assert list(read_lines(str(path))) == [b"a\n", b"bb\n", b"\n", b"c"]
+    path.write_bytes(b"")
+    assert list(read_lines(str(path))) == []
+
+
+def test_read_lines_truncated(tmp_path):
+    # another program truncates the file while it is read
+    path = tmp_path / "todo.txt"
+    path.write_bytes(b"".join(b"task %d\n" % i for i in range(100000)))
+    lines = read_lines(str(path))
+    assert next(lines) == b"task 0\n"
+    with open(str(path), "r+b") as file:
+        file.truncate(0)
+    assert len(list(lines)) < 100000
+
+
+def test_read_lines_reverse():
+    for data in [b"", b"\n", b"a", b"a\nbb\n\nccc\n", b"x\n \n\n", "é\nab\n".encode("utf-8")]:
+        expected = []
+        offset = 0
+        for line in data.split(b"\n"):
+            expected.append((offset, line))
+            offset += len(line) + 1
+        for block_size in [1, 2, 3, 8192]:
+            file = io.BytesIO(data)
+            assert list(read_lines_reverse(file, len(data), block_size)) == expected[::-1]
+
+
+def test_tail_index(tmp_path):
+    path = tmp_path / "done.txt"
+    path.write_bytes(b"a\n\nb\n c\n\n \n")
+    with open(str(path), "rb") as file:
+        index = TailIndex(count=2)
+        index.reset(file)
+        assert index.is_valid(file)
+        assert [index.pop(file), index.pop(file), index.pop(file), index.pop(file)] == [
+            5,
+            3,
+            0,
+            None,
+        ]
+
+
+def test_undo_archive(tmp_path):
+    (tmp_path / "todo.txt").write_text("Call mom\n")
+    (tmp_path / "done.txt").write_text("x 2020-01-01 one\nx 2020-01-02 two\n\n  \n")
+    tasklist = Tasklist.open_file(str(tmp_path / "todo.txt"))
+    tasklist.archive_index.count = 1
+    assert tasklist.undo_archive().raw == "x 2020-01-02 two"
+    assert (tmp_path / "done.txt").read_text() == "x 2020-01-01 one\n"
+
+    tasklist.archive_tasks(Tasklist.filter_done_or_del)
+    assert (tmp_path / "done.txt").read_text() == "x 2020-01-01 one\nx 2020-01-02 two\n"
+    assert [t.raw for t in tasklist] == ["Call mom"]
+
+    (tmp_path / "done.txt").write_text("x 2020-01-01 one\nx 2020-01-03 three")
+    assert tasklist.undo_archive().raw == "x 2020-01-03 three"
+    tasklist.insert_new(-1, "x 2020-01-04 four")
+    tasklist.archive_tasks(Tasklist.filter_done_or_del)
+    assert (tmp_path / "done.txt").read_text() == (
+        "x 2020-01-01 one\nx 2020-01-03 three\nx 2020-01-04 four\n"
+    )
+    assert tasklist.undo_archive().raw == "x 2020-01-04 four"
+    assert tasklist.undo_archive().raw == "x 2020-01-03 three"
+    assert tasklist.undo_archive().raw == "x 2020-01-01 one"
+    assert tasklist.undo_archive() is None
+    assert (tmp_path / "done.txt").read_text() == ""
+    lines = ["Call mom", "x 2020-01-04 four", "x 2020-01-03 three", "x 2020-01-01 one"]
+    assert [t.raw for t in tasklist] == lines
+    assert (tmp_path / "todo.txt").read_text() == "\n".join(lines) + "\n"
+
+
+def test_archive_without_newline(tmp_path):
+    (tmp_path / "todo.txt").write_text("x 2020-01-02 two\n")
+    (tmp_path / "done.txt").write_text("x 2020-01-01 one")
+    tasklist = Tasklist.open_file(str(tmp_path / "todo.txt"))
+    tasklist.archive_tasks(Tasklist.filter_done_or_del)
+    assert (tmp_path / "done.txt").read_text() == "x 2020-01-01 one\nx 2020-01-02 two\n"
+
+
+def test_tail_index_sources(tmp_path):
+    path = tmp_path / "done.txt"
+    path.write_bytes(b"a\n")
+    with open(str(path), "r+b") as file:
+        index = TailIndex()
+        index.reset(file)
+        index.append(2, "home.todo.txt")
+        index.append(5)
+        assert index.pop(file) == 5 and index.pop_source(5) is None
+        assert index.pop(file) == 2 and index.pop_source(2) == "home.todo.txt"
+        assert index.pop(file) == 0 and index.pop_source(0) is None
+        index.append(2, "home.todo.txt")
+        index.reset(file)
+        assert index.pop_source(2) is None
@@ -0,0 +1,52 @@
+import configparser
+import pytest
+from todd.tasklib import Tasklist
+from todd.taskui import ColorScheme, KeyBindings, MainUI
+
+
+def make_ui(path, deferred):
+    path.write_text("Call mom\nBuy milk\nFix bike\nPay bills\nWater plants\n")
+    tasklist = Tasklist.open_file(str(path))
+    ui = MainUI(tasklist, KeyBindings({}), ColorScheme("default", configparser.ConfigParser()))
+    ui.view_days = -1
+    ui.refresh()
+    ui.deferred = deferred
+    ui.loop.screen_size = (80, 24)
+    return ui
+
+
+@pytest.mark.parametrize("keys", [["D", "x"], ["j", "D", "D", "k", "x"], ["j", "x", "D", "j", "x"]])
+def test_input_batch(keys, tmp_path):
+    # a batch of keys has the same effect as the keys handled one at a time
+    expected = make_ui(tmp_path / "expected.txt", False)
+    for key in keys:
+        expected.loop.process_input([key])
+    ui = make_ui(tmp_path / "todo.txt", True)
+    ui.loop.process_input(keys)
+    ui.render()
+    assert [t.raw for t in ui.tasklist] == [t.raw for t in expected.tasklist]
+    assert ui.listbox.get_focus()[1] == expected.listbox.get_focus()[1]
+
+
+def test_input_batch_refills_once(tmp_path):
+    ui = make_ui(tmp_path / "todo.txt", True)
+    fills = []
+    fill_listbox = ui.fill_listbox
+    ui.fill_listbox = lambda keep=None: (fills.append(keep), fill_listbox(keep))
+    ui.loop.process_input(["j", "j", "x", "j", "j"])
+    assert len(ui.tasklist) == 4  # completed and archived
+    assert len(fills) == 1  # before the first key after x
+    ui.render()
+    assert len(fills) == 1
+
+
+def test_agenda_fuzzy_search(tmp_path):
+    ui = make_ui(tmp_path / "todo.txt", False)
+    ui.tasklist.insert_new(-1, "Pay the plumber due:" + ui.clock.today_str)
+    ui.tasklist.insert_new(-1, "Plan trip due:" + ui.clock.today_str)
+    ui.toggle_agenda()
+    ui.search_string = "pyplm"
+    ui.refresh()
+    assert ui.walker.tasks == []
+    ui.toggle_fuzzy_search()
+    assert [t.raw for t in ui.walker.tasks] == ["Pay the plumber due:" + ui.clock.today_str]
@@ -0,0 +1,173 @@
+import random
+import re
+from todd.tasklib import Tasklist
+from todd.tasklib.matcher import FuzzyMatcher, TermMatcher
+from todd.tasklib.search import SearchSession, is_narrowed
+from todd.tasklib.test.benchmark import generate_lines
+
+
+def test_is_narrowed():
+    assert is_narrowed(["ca"], ["cal"])
+    assert is_narrowed(["cal"], ["Call", "@home"])
+    assert is_narrowed(["call", "@ho"], ["@home", "call"])
+    assert not is_narrowed(["cal"], ["ca"])
+    assert not is_narrowed(["call", "@home"], ["call"])
+
+
+def test_search_session():
+    tasklist = Tasklist(generate_lines(500))
+    items = tasklist.get_items()
+    session = SearchSession()
+
+    def check(query, key=0):
+        expected = Tasklist.search(Tasklist.prep_search(query), items)
+        assert session.search(key, lambda: items, query) == expected
+
+    for query in ["c", "ca", "cal", "call", "call ", "call @", "call @h", "call @ho"]:
+        check(query)
+    assert session.full_scans == 1
+
+    check("call @h")
+    check("call")
+    check("")
+    assert session.full_scans == 3
+
+    check("call")
+    check("call +f", key=1)
+    assert session.full_scans == 5
+
+
+def test_search_session_random():
+    tasklist = Tasklist(generate_lines(300, seed=1))
+    items = tasklist.get_items()
+    session = SearchSession()
+    rnd = random.Random(1)
+    query = ""
+    for _ in range(300):
+        if query and rnd.random() < 0.3:
+            query = query[:-1]
+        else:
+            query += rnd.choice("abcdeilmort @+")
+        expected = Tasklist.search(Tasklist.prep_search(query), items) if query.strip() else items
+        assert session.search(0, lambda: items, query) == expected
+
+
+def test_search_session_key():
+    tasklist = Tasklist(["Build a flux capacitor +future @weekend", "Buy some cows @farm"])
+    session = SearchSession()
+
+    def search(query):
+        return session.search(tasklist.revision, tasklist.get_items, query)
+
+    assert [t.raw for t in search("future")] == [t.raw for t in tasklist if "future" in t.raw]
+    task = tasklist.insert_new(-1, "a future task")
+    assert task in search("future")
+    task.update("a past task")
+    assert task not in search("future")
+
+
+def test_trigram_index(tmp_path):
+    lines = generate_lines(500, seed=2) + ["Straße kaufen", "Fix the ſun", "ab"]
+    path = tmp_path / "todo.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tasklist = Tasklist.open_file(str(path))
+    tasklist.search_index = True
+    queries = ["a", "ab", "CALL", "call @home", "+tax pay", "xyz", "ſun", "sun", "straße", "e k"]
+
+    def check():
+        for query in queries:
+            expected = Tasklist.search(Tasklist.prep_search(query), tasklist.get_items())
+            assert tasklist.search_items(query) == expected
+
+    check()
+    tasklist.insert_new(-1, "call mom @home")
+    tasklist[0].update("pay the +tax")
+    tasklist.delete_by_id(tasklist[1].task_id)
+    tasklist.archive_tasks(Tasklist.filter_done_or_del)
+    check()
+    assert tasklist.get_trigram_index().get_candidates(["ca"]) is None
+
+
+def test_term_matcher():
+    matcher = TermMatcher(["ab", "BC", "x"])
+    assert matcher.get_spans("abc x ABx") == [(0, 3), (4, 5), (6, 9)]
+    assert matcher.get_spans("abc") is None
+    assert matcher.get_highlight("Abc-x", "m") == [("m", "Abc"), "-", ("m", "x")]
+    assert TermMatcher(["straße"]).get_spans("STRASSE Straße") == [(8, 14)]
+    assert TermMatcher(["sun"]).get_spans("İ ſun") == [(2, 5)]
+    assert TermMatcher(["i"]).get_highlight("İi", "m") == [("m", "İi")]
+
+
+def test_term_matcher_regex():
+    # same matches as the lookahead regex that was used before
+    rnd = random.Random(3)
+    lines = generate_lines(300, seed=3) + ["Straße", "ſun İstanbul", "KELVIN"]
+    for _ in range(200):
+        terms = ["".join(rnd.choice("aeiklnorsty+@ſ") for _ in range(rnd.randint(1, 3)))]
+        terms += rnd.sample(["s", "ca", "@home", "+tax", "K"], rnd.randint(0, 2))
+        regex = re.compile("".join("(?=.*(" + re.escape(t) + "))" for t in terms), re.IGNORECASE)
+        matcher = TermMatcher(terms)
+        for line in lines:
+            assert (matcher.get_spans(line) is not None) == bool(regex.search(line))
+
+
+def test_fuzzy_matcher():
+    tasklist = Tasklist(
+        [
+            "Call the plumber @phone",
+            "Clean all windows",
+            "Fix the calendar sync",
+            "call mom @home",
+            "Buy milk",
+        ]
+    )
+    search = Tasklist.prep_search("cal", fuzzy=True)
+    assert [t.raw for t in Tasklist.search(search, tasklist.get_items())] == [
+        "Call the plumber @phone",
+        "Fix the calendar sync",
+        "call mom @home",
+        "Clean all windows",
+    ]
+    search = Tasklist.prep_search("cl win", fuzzy=True)
+    assert [t.raw for t in Tasklist.search(search, tasklist.get_items())][0] == "Clean all windows"
+    assert Tasklist.get_search_highlight(search, "Clean all windows") == [
+        ("search_match", "Cl"),
+        "ean all ",
+        ("search_match", "win"),
+        "dows",
+    ]
+    search.limit = 1
+    assert len(Tasklist.search(search, tasklist.get_items())) == 1
+
+
+def test_fuzzy_matcher_top_k():
+    tasklist = Tasklist(generate_lines(1000, seed=4))
+    search = Tasklist.prep_search("cal pa", fuzzy=True)
+    scored = []
+    for i, t in enumerate(tasklist.get_items()):
+        res = search.get_score(t.search_key)
+        if res is not None:
+            scored.append((-res[0], i, t))
+    expected = [entry[2] for entry in sorted(scored, key=lambda entry: entry[:2])][: search.limit]
+    assert Tasklist.search(search, tasklist.get_items()) == expected
+
+
+def test_shared_matcher():
+    # prep_search returns the same matcher for the same query, it must not keep results
+    tasklist = Tasklist(["Call mom @phone", "Buy milk", "call plumber"])
+    for fuzzy in (False, True):
+        search = Tasklist.prep_search("cal", fuzzy)
+        assert Tasklist.prep_search("cal", fuzzy) is search
+        assert len(Tasklist.search(search, tasklist.get_items())) == 2
+        assert Tasklist.search(search, tasklist.get_items()[1:2]) == []
+        assert Tasklist.get_search_highlight(search, "call plumber")[0] == ("search_match", "cal")
+
+
+def test_fuzzy_matcher_filter():
+    tasklist = Tasklist(["Call the plumber @phone", "Buy milk", "Clean all windows", "call mom"])
+    search = FuzzyMatcher(["cal"], limit=1)
+    assert [t.raw for t in search.filter(tasklist.get_items())] == [
+        "Call the plumber @phone",
+        "Clean all windows",
+        "call mom",
+    ]
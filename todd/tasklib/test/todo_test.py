@@ -1,6 +1,9 @@
 import pytest
 import datetime
+import random
+from array import array
 from todd.tasklib import *
+from todd.tasklib.test.benchmark import generate_lines
 
 import pprint
 
@@ -36,35 +39,35 @@ def test_tasklist_init(tasklist):
 def test_tasklist_parse_entries(tasklist):
     task = tasklist.get_items()[0]
     assert task.raw == TODO_COWS
-    assert task.contexts == ["@farm"]
-    assert task.tags == ["+tag-x"]
+    assert task.contexts == ("@farm",)
+    assert task.tags == ("+tag-x",)
     assert task.priority == ""
 
     task = tasklist.get_items()[1]
     assert task.raw == TODO_FLUX
-    assert task.contexts == ["@weekend"]
-    assert task.tags == ["+future"]
+    assert task.contexts == ("@weekend",)
+    assert task.tags == ("+future",)
     assert task.priority == "A"
 
     task = tasklist.get_items()[2]
     assert task.raw == TODO_TRASH
-    assert task.contexts == ["@home"]
-    assert task.tags == []
+    assert task.contexts == ("@home",)
+    assert task.tags == ()
     assert task.due_date == "2018-02-21"
     assert task.creation_date == "2000-01-01"
     assert task.priority == "F"
 
     task = tasklist.get_items()[3]
     assert task.raw == TODO_DONE
-    assert task.contexts == []
-    assert task.tags == ["+future", "+tag-x"]
+    assert task.contexts == ()
+    assert task.tags == ("+future", "+tag-x")
     assert task.done_date == "1999-01-07"
     assert task.priority == ""
 
     task = tasklist.get_items()[4]
     assert task.raw == TODO_PLAN
-    assert task.contexts == ["@weekend"]
-    assert task.tags == ["+family"]
+    assert task.contexts == ("@weekend",)
+    assert task.tags == ("+family",)
     assert task.priority == ""
 
 
@@ -86,11 +89,28 @@ def test_context_tag_regex(tasklist):
         ]
     )
     task = tasklist[0]
-    assert task.contexts == ["@email", "@farm"]
-    assert task.tags == ["+tag-x"]
+    assert task.contexts == ("@email", "@farm")
+    assert task.tags == ("+tag-x",)
     task = tasklist[1]
-    assert task.contexts == ["@weekend"]
-    assert task.tags == ["+future", "+tag-y"]
+    assert task.contexts == ("@weekend",)
+    assert task.tags == ("+future", "+tag-y")
+
+
+def test_task_shared_fields(tasklist):
+    tasklist.set_text_items([TODO_FLUX, TODO_PLAN, "Wash the car +future @weekend due:2018-02-21"])
+    assert not hasattr(tasklist[0], "__dict__")
+    assert tasklist[0].contexts is tasklist[1].contexts
+    assert tasklist[0].tags is tasklist[2].tags
+    size, per_task = tasklist.get_memory_usage()
+    assert size > 0 and per_task == size / 3
+
+
+def test_task_shared_fields_bounded():
+    from todd.tasklib.task import _shared_tuple
+
+    tasks = [Task("Task @c{0} +t{0}".format(i), i) for i in range(10000)]
+    assert all(t.contexts == ("@c{0}".format(i),) for i, t in enumerate(tasks))
+    assert _shared_tuple.cache_info().currsize <= _shared_tuple.cache_info().maxsize
 
 
 def test_tasklist_all_contexts(tasklist):
@@ -241,3 +261,338 @@ def test_set_priority(tasklist):
     assert tasklist[0].raw == TODO_COWS
     tasklist[1].set_priority("")
     assert tasklist[1].raw == TODO_FLUX_TEXT
+
+
+def scan_all(text):
+    return (
+        Task.scan_priority(text),
+        Task.scan_contexts(text),
+        Task.scan_tags(text),
+        Task.scan_done_date(text),
+        Task.scan_creation_date(text),
+        Task.scan_due_date(text),
+        Task.scan_rec_int(text),
+    )
+
+
+def test_tokenize_matches_scan():
+    lines = [
+        "",
+        TODO_COWS,
+        TODO_FLUX,
+        TODO_TRASH,
+        TODO_DONE,
+        TODO_PLAN,
+        "(A)No Priority",
+        "(a) 2000-01-01 lower case prio",
+        "x 2000-01-01  (B)\t2000-01-02 done with prio and creation",
+        "x 2000-01-01",
+        "x  2000-01-01 two spaces",
+        "2000-01-01creation without space",
+        "overdue:2000-01-01 due:2000-02-02 due:2000-03-03",
+        "due:tomorrow due:2000-01-01x rec:x rec:+12dx rec:3w",
+        "@ + a@b a+b @@c ++d @due:2000-01-01",
+        "٢٠٠٠-٠١-٠١ unicode digits",
+    ]
+    for line in lines:
+        assert Task.tokenize(line) == scan_all(line), line
+
+
+def test_tokenize_matches_scan_random():
+    import random
+
+    words = ["x", "(A)", "(a)", "(_)", "2000-01-01", "2000-1-01", "due:2000-01-02"]
+    words += ["xdue:2000-01-03x", "due:mo", "rec:1w", "rec:+2m", "rec:+x", "rec:12", "@", "@a"]
+    words += ["+", "+b", "a@b", "a+b", "text", "x 2000-01-01", "\t"]
+    rnd = random.Random(42)
+    for i in range(5000):
+        line = "".join(
+            rnd.choice(words) + rnd.choice(["", " ", "  "]) for _ in range(rnd.randint(0, 8))
+        ).strip()
+        assert Task.tokenize(line) == scan_all(line), line
+
+
+def test_tasklist_index(tasklist, tmp_path):
+    assert tasklist.get_index(3) == 2
+    assert tasklist.get_by_id(3).raw == TODO_TRASH
+    tasklist.insert_new(-1, "appended")
+    assert tasklist.get_index(6) == 5
+    tasklist.insert_new(0, "first")
+    assert [tasklist.get_index(i) for i in [7, 1, 2, 3, 4, 5, 6]] == [0, 1, 2, 3, 4, 5, 6]
+    tasklist.delete_by_id(2)
+    assert tasklist.get_index(2) is None and tasklist.get_by_id(2) is None
+    assert tasklist.get_index(3) == 2
+    tasklist.delete_by_id(6)
+    assert tasklist.get_index(6) is None
+
+    tasklist.file_path = str(tmp_path / "todo.txt")
+    tasklist.archive_path = str(tmp_path / "done.txt")
+    tasklist.archive_tasks(Tasklist.filter_done_or_del)
+    assert tasklist.get_by_id(4) is None
+    assert [tasklist.get_index(t.task_id) for t in tasklist] == [0, 1, 2, 3]
+
+
+def test_tasklist_index_random():
+    # positions are only rebuilt after the changed index
+    rnd = random.Random(5)
+    tasklist = Tasklist(generate_lines(200, seed=5))
+    for _ in range(300):
+        if rnd.random() < 0.5:
+            tasklist.insert_new(rnd.randint(0, len(tasklist)), "new task")
+        else:
+            tasklist.delete_by_id(tasklist[rnd.randrange(len(tasklist))].task_id)
+        for task_id in rnd.sample(range(tasklist.next_id), 3):
+            task = tasklist.get_by_id(task_id)
+            assert tasklist.get_index(task_id) == (
+                tasklist.get_items().index(task) if task else None
+            )
+    assert [tasklist.get_index(t.task_id) for t in tasklist] == list(range(len(tasklist)))
+
+
+def test_tasklist_context_index(tasklist, today):
+    assert tasklist.get_context_counts() == {"@farm": 1, "@home": 1, "@weekend": 2}
+    assert tasklist.get_context_ids("@weekend") == {2, 5}
+    tasklist[0].update("Buy some cows @barn")
+    tasklist.insert_new(-1, "Mow the lawn @home +garden")
+    tasklist.delete_by_id(5)
+    assert tasklist.all_contexts() == ["@barn", "@home", "@weekend"]
+    assert tasklist.get_context_ids("@home") == {3, 6}
+    assert tasklist.all_tags() == ["+future", "+garden", "+tag-x"]
+    assert tasklist.get_tag_counts()["+future"] == 2
+    assert [t.task_id for t in tasklist.get_items_sorted("due", "@home")] == [3, 6]
+    tasklist.set_text_items([TODO_COWS])
+    assert tasklist.all_contexts() == ["@farm"]
+
+
+def test_tasklist_sorted_maintained(tasklist, today):
+    for sort_by in Tasklist.sort_keys:
+        tasklist.get_items_sorted(sort_by)
+    tasklist[0].set_due(today)
+    tasklist[1].set_done()
+    tasklist[4].set_priority("B")
+    tasklist.insert_new(-1, "(C) Fix the fence due:2018-02-20")
+    tasklist.delete_by_id(3)
+    for sort_by, key in Tasklist.sort_keys.items():
+        assert tasklist.get_items_sorted(sort_by) == sorted(tasklist.get_items(), key=key)
+
+
+def write_todo(tmp_path, text):
+    path = tmp_path / "todo.txt"
+    path.write_bytes(text.encode("utf-8"))
+    return Tasklist.open_file(str(path))
+
+
+def read_todo(tasklist):
+    with open(tasklist.file_path, encoding="utf-8") as file:
+        return file.read()
+
+
+def test_tasklist_save_partial(tmp_path, today):
+    lines = [TODO_COWS, TODO_FLUX, TODO_TRASH, TODO_DONE, TODO_PLAN]
+    tasklist = write_todo(tmp_path, "\n".join(lines) + "\n")
+    assert not tasklist.save()
+
+    tasklist[2].set_priority("B")  # same length, patched in place
+    assert tasklist.save()
+    lines[2] = lines[2].replace("(F)", "(B)")
+    assert read_todo(tasklist) == "\n".join(lines) + "\n"
+
+    tasklist[1].set_done()
+    tasklist.insert_new(-1, "Fix the fence @home")
+    tasklist.delete_by_id(4)
+    assert tasklist.save()
+    assert read_todo(tasklist) == "".join(t.raw + "\n" for t in tasklist)
+    assert not tasklist.save()
+
+    tasklist.insert_new(-1, "Paint the fence @home")
+    assert tasklist.save()
+    assert read_todo(tasklist).endswith("Paint the fence @home\n")
+    tasklist.set_text_items(["one", "two"])
+    assert tasklist.save()
+    assert read_todo(tasklist) == "one\ntwo\n"
+
+
+def test_tasklist_save_normalizes(tmp_path):
+    tasklist = write_todo(tmp_path, "  a task \n\nb task\r\nc task")
+    assert [t.raw for t in tasklist] == ["a task", "b task", "c task"]
+    tasklist[2].set_priority("A")
+    assert tasklist.save()
+    assert read_todo(tasklist) == "a task\nb task\n(A) c task\n"
+
+
+def test_tasklist_reload_keeps_ids(tmp_path):
+    lines = [TODO_COWS, TODO_FLUX, TODO_TRASH, TODO_DONE, TODO_PLAN]
+    tasklist = write_todo(tmp_path, "\n".join(lines) + "\n")
+    assert tasklist.all_contexts() == ["@farm", "@home", "@weekend"]
+    assert not tasklist.reload()
+
+    lines = [TODO_FLUX, "(B) " + TODO_COWS, TODO_TRASH, "Call mom @phone", TODO_PLAN, TODO_DONE]
+    (tmp_path / "todo.txt").write_text("\n".join(lines) + "\n")
+    delta = tasklist.reload()
+    assert delta.updated == [1]
+    assert delta.inserted == [6]
+    assert delta.deleted == []
+    assert [t.raw for t in tasklist] == lines
+    assert [t.task_id for t in tasklist] == [2, 1, 3, 6, 5, 4]
+    assert tasklist.all_contexts() == ["@farm", "@home", "@phone", "@weekend"]
+
+    (tmp_path / "todo.txt").write_text("\n".join(lines[:2] + lines[3:]) + "\n")
+    delta = tasklist.reload()
+    assert (delta.inserted, delta.updated, delta.deleted) == ([], [], [3])
+    assert tasklist.get_by_id(3) is None and tasklist.get_index(6) == 2
+    assert not tasklist.save()
+
+
+def test_tasklist_open_lazy(tmp_path):
+    tasklist = write_todo(tmp_path, TODO_COWS + "\n")
+    (tmp_path / "todo.txt").write_text(TODO_FLUX + "\n\n" + TODO_TRASH + "\n")
+    assert [t.raw for t in tasklist] == [TODO_FLUX, TODO_TRASH]
+    task = Task.lazy(TODO_TRASH, 1)
+    assert task.due_date == "2018-02-21"
+    assert task.contexts == ("@home",)
+
+
+def test_tasklist_split_lines():
+    lines = [b"a\n", b"  b\n", b"c\r\n", b"d\re\n"]
+    assert Tasklist.split_lines(lines) == (["a", "b", "c", "d", "e"], None)
+    lines = ["(A) café +b\n".encode("utf-8"), b"c @d\n"]
+    assert Tasklist.split_lines(lines) == (["(A) café +b", "c @d"], array("q", [13, 18]))
+    assert Tasklist.split_lines([b"a\n", b"b"])[1] is None
+
+
+def test_tasklist_archive(tmp_path, today):
+    lines = [TODO_COWS, TODO_FLUX, TODO_TRASH, TODO_DONE, TODO_PLAN]
+    tasklist = write_todo(tmp_path, "\n".join(lines) + "\n")
+    tasklist[0].set_done()
+    tasklist[4].set_deleted()
+    tasklist.archive_tasks(Tasklist.filter_done_or_del)
+    assert [t.task_id for t in tasklist] == [2, 3]
+    assert tasklist.all_contexts() == ["@home", "@weekend"]
+    assert read_todo(tasklist) == TODO_FLUX + "\n" + TODO_TRASH + "\n"
+    done = (tmp_path / "done.txt").read_text().splitlines()
+    assert done == ["x {} {}".format(today, TODO_COWS), TODO_DONE, TODO_PLAN + " del:true"]
+
+    tasklist.archive_task(tasklist.get_by_id(2))
+    assert [t.task_id for t in tasklist] == [3]
+    assert read_todo(tasklist) == TODO_TRASH + "\n"
+    assert (tmp_path / "done.txt").read_text().splitlines()[-1] == TODO_FLUX
+
+
+def test_task_iter_due_dates():
+    today = datetime.date(2030, 1, 10)
+    dates = Task("Pay rent due:2030-01-31 rec:+1m", 1).iter_due_dates(today)
+    assert [next(dates) for _ in range(3)] == [
+        datetime.date(2030, 1, 31),
+        datetime.date(2030, 2, 28),
+        datetime.date(2030, 3, 31),
+    ]
+    dates = Task("Water plants due:2030-01-01 rec:2d", 1).iter_due_dates(today)
+    assert [next(dates) for _ in range(3)] == [
+        datetime.date(2030, 1, 1),
+        datetime.date(2030, 1, 12),
+        datetime.date(2030, 1, 14),
+    ]
+    assert list(Task("Dentist due:2030-01-05", 1).iter_due_dates(today)) == [
+        datetime.date(2030, 1, 5)
+    ]
+    assert list(Task("Later rec:1d", 1).iter_due_dates(today)) == []
+
+
+def test_zero_interval_agenda():
+    # rec:0d never moves forward, only the due date itself is listed
+    tasklist = Tasklist(["Loop due:2030-01-02 rec:0d", "Loop2 due:2030-01-03 rec:+0d"])
+    today = datetime.date(2030, 1, 1)
+    assert list(tasklist[0].iter_due_dates(today)) == [datetime.date(2030, 1, 2)]
+    assert [(date.day, projected) for date, _, projected in tasklist.get_agenda(14, today)] == [
+        (2, False),
+        (3, False),
+    ]
+
+
+def test_tasklist_agenda():
+    tasklist = Tasklist(
+        [
+            "Pay rent due:2030-01-01 rec:+1w",
+            "x 2030-01-01 Done due:2030-01-02",
+            "Dentist due:2030-01-05",
+            "Later due:2031-01-01 rec:1d",
+            "Overdue due:2029-12-01",
+        ]
+    )
+    today = datetime.date(2030, 1, 1)
+
+    def agenda(days):
+        return [
+            (date.isoformat(), t.raw.split()[0], projected)
+            for date, t, projected in tasklist.get_agenda(days, today)
+        ]
+
+    assert agenda(10) == [
+        ("2029-12-01", "Overdue", False),
+        ("2030-01-01", "Pay", False),
+        ("2030-01-05", "Dentist", False),
+        ("2030-01-08", "Pay", True),
+    ]
+    tasklist[0].set_done()
+    tasklist.insert_new(-1, "Call mom due:2030-01-03 rec:+3d")
+    assert agenda(7) == [
+        ("2029-12-01", "Overdue", False),
+        ("2030-01-03", "Call", False),
+        ("2030-01-05", "Dentist", False),
+        ("2030-01-06", "Call", True),
+    ]
+
+
+def test_tasklist_stats(tmp_path):
+    path = tmp_path / "todo.txt"
+    path.write_text("\n".join(generate_lines(300, seed=5)) + "\n", encoding="utf-8")
+    tasklist = Tasklist.open_file(str(path))
+    today = "2021-06-15"
+
+    def check():
+        items = tasklist.get_items()
+        pending = Tasklist.filter_pending(items)
+        assert tasklist.get_stats(today) == {
+            "pending": len(pending),
+            "done": len(items) - len(pending),
+            "due": len(Tasklist.filter_due(items, today)),
+            "overdue": len([t for t in pending if t.due_date and t.due_date < today]),
+        }
+
+    check()
+    tasklist[0].set_done()
+    tasklist[1].set_due(datetime.date(2021, 6, 15))
+    tasklist[2].set_done(False)
+    tasklist.insert_new(-1, "Call mom due:2021-01-01")
+    tasklist.delete_by_id(tasklist[3].task_id)
+    check()
+    tasklist.archive_tasks(Tasklist.filter_done_or_del)
+    check()
+    tasklist.undo_archive()
+    check()
+
+
+def test_tasklist_view_counter():
+    tasklist = Tasklist(generate_lines(300, seed=6))
+    today = "2021-06-15"
+
+    def check(context, due_by):
+        items = tasklist.get_items_sorted("due", context)
+        if due_by:
+            items = [t for t in items if t.is_due(due_by) or not t.has_due()]
+        counter = tasklist.get_counter(context, due_by)
+        pending = Tasklist.filter_pending(items)
+        assert (counter.pending, counter.done) == (len(pending), len(items) - len(pending))
+        assert counter.get_due_counts(today)[0] == len(Tasklist.filter_due(items, today))
+
+    for view in [("@home", None), (None, "2021-06-20"), ("@phone", "2021-06-01")]:
+        counter = tasklist.get_counter(*view)
+        check(*view)
+        tasklist[0].update("Call mom @home @phone due:2021-06-01")
+        tasklist[1].set_done()
+        tasklist.insert_new(-1, "Fix bike @home")
+        tasklist.delete_by_id(tasklist[5].task_id)
+        assert tasklist.get_counter(*view) is counter
+        check(*view)
+    # only the last view is kept
+    assert ("counts", "@home", None) not in tasklist._indexes
@@ -0,0 +1,163 @@
+import os
+from todd.tasklib import Tasklist, Workspace
+from todd.tasklib.workspace import find_todo_files
+
+
+def make_workspace(tmp_path):
+    (tmp_path / "home.todo.txt").write_text("Call mom @phone\nBuy milk +shop\n")
+    (tmp_path / "done.txt").write_text("x 2021-01-01 Old\n")
+    (tmp_path / "work").mkdir()
+    (tmp_path / "work" / "todo.txt").write_text("(A) Fix bug +todd\nWrite report\n")
+    (tmp_path / "work" / "notes.txt").write_text("not a todo file\n")
+    return Workspace.open_files([str(tmp_path)])
+
+
+def test_find_todo_files(tmp_path):
+    make_workspace(tmp_path)
+    assert find_todo_files(str(tmp_path)) == [
+        str(tmp_path / "home.todo.txt"),
+        str(tmp_path / "work" / "todo.txt"),
+    ]
+
+
+def test_find_todo_files_exclude(tmp_path):
+    make_workspace(tmp_path)
+    (tmp_path / "notes.txt").write_text("x marks the spot\n")
+    (tmp_path / "old.todo.txt").write_text("x 2021-01-01 Old\n")
+    (tmp_path / ".hidden.todo.txt").write_text("Call mom\n")
+    assert find_todo_files(str(tmp_path), [str(tmp_path / "old.todo.txt")]) == [
+        str(tmp_path / "home.todo.txt"),
+        str(tmp_path / "work" / "todo.txt"),
+    ]
+    assert find_todo_files(str(tmp_path), [str(tmp_path / "work" / "todo.txt")]) == [
+        str(tmp_path / "home.todo.txt"),
+        str(tmp_path / "old.todo.txt"),
+    ]
+    workspace = Workspace.open_files([str(tmp_path)], str(tmp_path / "old.todo.txt"))
+    assert workspace.file_paths == [
+        str(tmp_path / "home.todo.txt"),
+        str(tmp_path / "work" / "todo.txt"),
+    ]
+
+
+def test_workspace_load(tmp_path):
+    workspace = make_workspace(tmp_path)
+    assert workspace.archive_path == str(tmp_path / "done.txt")
+    assert [t.raw for t in workspace] == [
+        "Call mom @phone",
+        "Buy milk +shop",
+        "(A) Fix bug +todd",
+        "Write report",
+    ]
+    assert [os.path.basename(os.path.dirname(t.source)) for t in workspace][2:] == ["work"] * 2
+    assert workspace[0].source == str(tmp_path / "home.todo.txt")
+    assert workspace.all_contexts() == ["@phone"]
+    assert [t.raw for t in workspace.get_items_sorted("prio")][0] == "(A) Fix bug +todd"
+
+
+def test_workspace_save(tmp_path):
+    workspace = make_workspace(tmp_path)
+    work = tmp_path / "work" / "todo.txt"
+    os.utime(str(tmp_path / "home.todo.txt"), (0, 0))
+
+    workspace[3].update("Write report due:2021-06-01")
+    assert workspace.save()
+    assert work.read_text() == "(A) Fix bug +todd\nWrite report due:2021-06-01\n"
+    # only the changed file was written
+    assert os.path.getmtime(str(tmp_path / "home.todo.txt")) == 0
+    assert not workspace.save()
+
+    task = workspace.insert_new(1, "New task")
+    assert task.source == str(tmp_path / "home.todo.txt")
+    workspace.delete_by_id(workspace[3].task_id)
+    workspace.save()
+    assert (tmp_path / "home.todo.txt").read_text() == "Call mom @phone\nNew task\nBuy milk +shop\n"
+    assert work.read_text() == "Write report due:2021-06-01\n"
+
+
+def test_workspace_archive(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace[1].set_done()
+    workspace.archive_tasks(Tasklist.filter_done_or_del)
+    assert (tmp_path / "home.todo.txt").read_text() == "Call mom @phone\n"
+    assert (tmp_path / "done.txt").read_text().splitlines()[-1].endswith("Buy milk +shop")
+    task = workspace.undo_archive()
+    assert task.source == str(tmp_path / "home.todo.txt")
+    assert (tmp_path / "home.todo.txt").read_text().splitlines()[-1].endswith("Buy milk +shop")
+
+
+def test_workspace_undo_archive_source(tmp_path):
+    workspace = make_workspace(tmp_path)
+    work = tmp_path / "work" / "todo.txt"
+    for task in [workspace[2], workspace[0]]:
+        task.set_done()
+        workspace.archive_task(task)
+    assert [t.raw for t in workspace] == ["Buy milk +shop", "Write report"]
+
+    assert workspace.undo_archive().source == str(tmp_path / "home.todo.txt")
+    task = workspace.undo_archive()
+    assert task.source == str(work)
+    assert [t.raw for t in workspace][2:] == ["Write report", task.raw]
+    workspace.save()
+    assert work.read_text() == "Write report\n" + task.raw + "\n"
+
+    # lines archived by someone else go to the first file
+    task = workspace[2]
+    task.set_done()
+    workspace.archive_task(task)
+    with open(str(tmp_path / "done.txt"), "a") as file:
+        file.write("x 2021-01-02 Other\n")
+    assert workspace.undo_archive().source == str(tmp_path / "home.todo.txt")
+    assert workspace.undo_archive().source == str(tmp_path / "home.todo.txt")
+
+
+def test_workspace_reload(tmp_path):
+    workspace = make_workspace(tmp_path)
+    ids = [t.task_id for t in workspace]
+    workspace[0].update("Call mom @phone +family")  # unsaved
+    work = tmp_path / "work" / "todo.txt"
+    work.write_text("(A) Fix bug +todd\nWrite report\nPlan trip\n")
+    os.utime(str(work), (1, 1))
+    assert workspace.has_file_changed()
+
+    delta = workspace.reload()
+    assert len(delta.inserted) == 1 and not delta.updated and not delta.deleted
+    assert [t.task_id for t in workspace][:4] == ids
+    assert workspace[0].raw == "Call mom @phone +family"
+    assert workspace[4].source == str(work)
+    assert not workspace.has_file_changed()
+
+    workspace.save()
+    assert (tmp_path / "home.todo.txt").read_text() == "Call mom @phone +family\nBuy milk +shop\n"
+    assert work.read_text() == "(A) Fix bug +todd\nWrite report\nPlan trip\n"
+
+
+def test_workspace_reload_with_empty_task(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace.insert_new(1, "")  # a new task that is being edited
+    work = tmp_path / "work" / "todo.txt"
+    work.write_text("Plan trip\n(A) Fix bug +todd\nWrite report\n")
+    os.utime(str(work), (1, 1))
+
+    workspace.reload()
+    assert [(t.raw, os.path.basename(t.source)) for t in workspace] == [
+        ("Call mom @phone", "home.todo.txt"),
+        ("Buy milk +shop", "home.todo.txt"),
+        ("Plan trip", "todo.txt"),
+        ("(A) Fix bug +todd", "todo.txt"),
+        ("Write report", "todo.txt"),
+    ]
+
+
+def test_workspace_writer(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace.start_writer(delay=0)
+    try:
+        workspace[0].set_done()
+        workspace.save()
+        workspace[2].update("(B) Fix bug +todd")
+        workspace.save()
+    finally:
+        workspace.stop_writer()
+    assert (tmp_path / "home.todo.txt").read_text().startswith("x ")
+    assert (tmp_path / "work" / "todo.txt").read_text().startswith("(B) Fix bug")
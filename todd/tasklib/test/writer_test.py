@@ -0,0 +1,61 @@
+import os
+import pytest
+import threading
+from todd.tasklib import Tasklist
+from todd.tasklib.writer import SaveWorker, write_atomic
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "todo.txt"
+    path.write_text("old\n")
+    os.chmod(str(path), 0o600)
+    write_atomic(str(path), b"new\n")
+    assert path.read_text() == "new\n"
+    assert os.stat(str(path)).st_mode & 0o777 == 0o600
+    assert os.listdir(str(tmp_path)) == ["todo.txt"]
+
+
+def test_save_worker_coalesces():
+    written = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def write(snapshot):
+        started.set()
+        release.wait()
+        written.append(snapshot)
+
+    worker = SaveWorker(write, delay=0)
+    worker.submit(1)
+    started.wait()
+    # the first write is busy, these are coalesced into one
+    for i in range(2, 10):
+        worker.submit(i)
+    release.set()
+    worker.stop()
+    assert written == [1, 9]
+
+
+def test_save_worker_error():
+    def write(snapshot):
+        raise IOError("disk full")
+
+    worker = SaveWorker(write, delay=0)
+    worker.submit(1)
+    with pytest.raises(IOError):
+        worker.stop()
+
+
+def test_tasklist_writer(tmp_path):
+    path = tmp_path / "todo.txt"
+    path.write_text("(A) Call mom\nBuy milk @store\n")
+    tasklist = Tasklist.open_file(str(path))
+    tasklist.start_writer(delay=10)
+    tasklist[0].set_priority("B")
+    assert tasklist.save()
+    tasklist.insert_new(-1, "Fix the fence")
+    assert tasklist.save()
+    assert not tasklist.save()
+    tasklist.stop_writer()
+    assert path.read_text() == "(B) Call mom\nBuy milk @store\nFix the fence\n"
+    assert not tasklist.has_file_changed()
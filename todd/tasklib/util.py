@@ -56,25 +56,29 @@ class Util:
             return date
 
     @staticmethod
-    def _get_next_weekday(day, *, today=_get_today()):
+    def _get_next_weekday(day, *, today=None):
+        if today is None:
+            today = _get_today()
         delta = day - today.weekday()
         if delta <= 0:
             delta += 7
         return today + datetime.timedelta(days=delta)
 
     @staticmethod
-    def _parse_relative_date(text, *, today=_get_today()):
+    def _parse_relative_date(text, *, today=None):
+        if today is None:
+            today = _get_today()
         text = text.strip().lower()
         text2 = text[:2]
         for idx, day in enumerate(Util.WDAY):
             if text2 == day[:2]:
                 return Util._get_next_weekday(idx, today=today)
         if text[:3] == "tod":
-            return Util.get_today()  # today
+            return today  # today
         elif text2 == "to":
-            return Util.get_today(1)  # tomorrow
+            return today + Util.delta1  # tomorrow
         elif text2 == "ye":
-            return Util.get_today(-1)  # yesterday
+            return today - Util.delta1  # yesterday
         try:
             delta = int(text)
             return today + datetime.timedelta(days=delta)
@@ -82,7 +86,17 @@ class Util:
             pass
 
     @staticmethod
-    def mod_date_by(date, text, *, today=_get_today()):
+    def is_date_mod(text):
+        """True if mod_date_by understands text (a relative date or an interval)."""
+        return (
+            Util._parse_relative_date(text) is not None
+            or Util._interval_parts_regex.fullmatch(text.strip()) is not None
+        )
+
+    @staticmethod
+    def mod_date_by(date, text, *, today=None):
+        if today is None:
+            today = _get_today()
         try:
             # try relative date
             date2 = Util._parse_relative_date(text, today=today)
@@ -105,7 +119,9 @@ class Util:
         return command_map
 
     @staticmethod
-    def get_date_name(date, *, today=_get_today()):
+    def get_date_name(date, *, today=None):
+        if today is None:
+            today = _get_today()
         if date is None:
             return "later"
         v = date - today
@@ -0,0 +1,198 @@
+import concurrent.futures
+import fnmatch
+import os
+from todd.tasklib.cache import ParseCache
+from todd.tasklib.tasklist import Delta, Tasklist
+from todd.tasklib.writer import write_atomic
+
+TODO_PATTERNS = ("todo.txt", "*.todo.txt")  # todo files in a workspace directory
+
+
+def find_todo_files(directory, exclude=()):
+    """Return the todo files of a workspace directory, sorted by name.
+
+    These are the files matching TODO_PATTERNS (todo.txt and *.todo.txt) in the directory
+    and the todo.txt files of its subdirectories. Hidden files and the paths in exclude (the
+    archive) are left out. Other files can be added to a workspace by naming them.
+    """
+    exclude = {os.path.realpath(path) for path in exclude}
+    res = []
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if entry.is_dir():
+            path = os.path.join(entry.path, "todo.txt")
+            if not os.path.isfile(path):
+                continue
+        elif not entry.name.startswith(".") and any(
+            fnmatch.fnmatch(entry.name, pattern) for pattern in TODO_PATTERNS
+        ):
+            path = entry.path
+        else:
+            continue
+        if os.path.realpath(path) not in exclude:
+            res.append(path)
+    return res
+
+
+def read_file(path):
+    # (mtime, stripped non empty lines) of a file, runs in the loader pool
+    with open(path, "rb") as file:
+        mtime = os.fstat(file.fileno()).st_mtime
+        data = file.read()
+    # decoded at once, no line offsets are needed to save a workspace file
+    text = data.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return (mtime, [line for line in (line.strip() for line in text.split("\n")) if line])
+
+
+class Workspace(Tasklist):
+    """Tasks of several todo.txt files in one list
+
+    Each task remembers its file in task.source, new tasks go to the first file. The files
+    are read in parallel, tasks are parsed on first use. Saving only writes the files whose
+    lines changed. All files share one archive.
+    """
+
+    def __init__(self, file_paths, archive_path=None, max_workers=None):
+        super(Workspace, self).__init__(None)
+        self.file_paths = list(file_paths)
+        self.file_path = self.file_paths[0]
+        if archive_path:
+            self.archive_path = archive_path
+        else:
+            self.archive_path = os.path.join(os.path.dirname(self.file_path), "done.txt")
+        self.max_workers = max_workers
+        self.file_ms = {}
+        self._written = {}  # path -> lines as last read or written
+        # the files are loaded on first use
+        self._source = self.file_path
+        self.set_saved(None)
+
+    @staticmethod
+    def open_files(paths, archive_path=None):
+        """Open the todo files in paths, directories are searched with find_todo_files.
+
+        Without archive_path the archive is done.txt in the first directory (or next to the
+        first file).
+        """
+        file_paths = []
+        for path in paths:
+            if os.path.isdir(path):
+                if archive_path is None:
+                    archive_path = os.path.join(path, "done.txt")
+                file_paths += find_todo_files(path, [archive_path])
+            else:
+                file_paths.append(path)
+        if not file_paths:
+            raise ValueError("No todo files in {0}".format(", ".join(paths)))
+        return Workspace(file_paths, archive_path)
+
+    def get_file_paths(self):
+        return self.file_paths
+
+    def has_file_changed(self):
+        return any(self.file_ms.get(path) != os.path.getmtime(path) for path in self.file_paths)
+
+    def reload(self):
+        """Read the files changed since they were last read or written, returns a Delta."""
+        if self.writer:
+            self.writer.flush()
+        self._source = None
+        paths = [
+            path
+            for path in self.file_paths
+            if path not in self._written or self.file_ms.get(path) != os.path.getmtime(path)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as pool:
+            results = list(pool.map(read_file, paths))
+        for path, (mtime, lines) in zip(paths, results):
+            self.file_ms[path] = mtime
+            self._written[path] = lines
+
+        if self._items:
+            # unchanged files keep their (possibly unsaved) tasks
+            files = self.get_file_lines()
+            for path in paths:
+                files[path] = self._written[path]
+            # update_text_items drops empty lines (like a new task being edited), the
+            # sources are paired with the lines it keeps
+            lines = []
+            sources = []
+            for path in self.file_paths:
+                for raw in files[path]:
+                    if raw.strip():
+                        lines.append(raw)
+                        sources.append(path)
+            delta = self.update_text_items(lines)
+            for t, path in zip(self._items, sources):
+                t.source = path
+        else:
+            tasks = []
+            for path in self.file_paths:
+                tasks += self.create_tasks(self._written[path], path, path)
+            self.set_tasks(tasks)
+            delta = Delta([t.task_id for t in self._items])
+        return delta
+
+    def get_file_lines(self):
+        """Return the raw texts of the tasks of each file (path -> list)."""
+        files = {path: [] for path in self.file_paths}
+        for t in self._items:
+            files[t.source].append(t.raw)
+        return files
+
+    def save_parse_cache(self):
+        if not self.parse_cache or self.is_dirty() or self.has_file_changed():
+            return False
+        files = {path: [] for path in self.file_paths}
+        for t in self._items:
+            files[t.source].append(t)
+        for path, tasks in files.items():
+            ParseCache(path).save(tasks)
+        return True
+
+    def save(self, full=False):
+        """Write the files whose lines changed, returns False if there was nothing to save.
+
+        With a writer the files are replaced in the background.
+        """
+        if not full and not self.is_dirty():
+            return False
+        if full:
+            if self.writer:
+                self.writer.flush()
+            self._written = {}
+        files = self.get_file_lines()
+        self.set_saved(None)
+        if self.writer:
+            self.writer.submit(files)
+        else:
+            self.write_lines(files)
+        return True
+
+    def write_lines(self, files):
+        # called with the lines of all files (by the writer thread if there is one)
+        for path, lines in files.items():
+            if lines != self._written.get(path):
+                write_atomic(path, "".join(line + "\n" for line in lines).encode("utf-8"))
+                self.file_ms[path] = os.path.getmtime(path)
+                self._written[path] = lines
+
+    def insert_new(self, index, raw):
+        task = super(Workspace, self).insert_new(index, raw)
+        task.source = self.file_path
+        return task
+
+    def insert_archived(self, raw, source):
+        # back to the end of its file (the first file if it is unknown)
+        if source not in self.file_paths:
+            source = self.file_path
+        ranks = {path: rank for rank, path in enumerate(self.file_paths)}
+        rank = ranks[source]
+        index = 0
+        for i, t in enumerate(self._items):
+            if ranks[t.source] <= rank:
+                index = i + 1
+        task = super(Workspace, self).insert_new(index, raw)
+        task.source = source
+        return task
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+def write_atomic(path, data):
+    """Write data to a temp file next to path and rename it over path."""
+    fd, tmp_path = tempfile.mkstemp(
+        prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path)
+    )
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class SaveWorker:
+    """Calls write(snapshot) in a background thread.
+
+    Snapshots submitted within delay seconds of each other are coalesced, only the latest
+    one gets written. An error raised by write is re-raised by the next submit or flush.
+    """
+
+    def __init__(self, write, delay=0.2):
+        self.write = write
+        self.delay = delay
+        self.cond = threading.Condition()
+        self.pending = None
+        self.busy = False
+        self.flushing = False
+        self.stopped = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="todd-save", daemon=True)
+        self.thread.start()
+
+    def submit(self, snapshot):
+        with self.cond:
+            self.raise_error()
+            self.pending = snapshot
+            self.cond.notify_all()
+
+    def flush(self):
+        """Wait until the pending snapshot has been written."""
+        with self.cond:
+            self.flushing = True
+            self.cond.notify_all()
+            while self.pending is not None or self.busy:
+                self.cond.wait()
+            self.flushing = False
+            self.raise_error()
+
+    def stop(self):
+        try:
+            self.flush()
+        finally:
+            with self.cond:
+                self.stopped = True
+                self.cond.notify_all()
+            self.thread.join()
+
+    def raise_error(self):
+        error, self.error = self.error, None
+        if error:
+            raise error
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.pending is None and not self.stopped:
+                    self.cond.wait()
+                if self.pending is None:
+                    return
+                # wait for more snapshots
+                deadline = time.monotonic() + self.delay
+                while not self.flushing and not self.stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                snapshot, self.pending = self.pending, None
+                self.busy = True
+            try:
+                self.write(snapshot)
+            except Exception as e:
+                self.error = e
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
@@ -1,6 +1,6 @@
 from .colorscheme import ColorScheme
 from .components import *
-from .components import EntryWidget, MenuItem, ViColumns, ViListBox
+from .components import EntryWidget, MenuItem, TaskWalker, ViColumns, ViListBox, WidgetCache
 from .keys import KeyBindings
 from .taskitem import TaskItem
 from .main_help import MainHelp
@@ -1,15 +1,20 @@
+import bisect
+import collections
 import urwid
 from todd.tasklib.util import Util
 
 
 class EntryWidget(urwid.Edit):
-    def __init__(self, edit_text, on_enter):
+    def __init__(self, edit_text, on_enter, key_handlers=None):
         self.on_enter = on_enter
+        self.key_handlers = key_handlers or {}
         super(EntryWidget, self).__init__(edit_text=edit_text)
 
     def keypress(self, size, key):
         if key == "enter":
             self.on_enter(self.edit_text)
+        elif key in self.key_handlers:
+            self.key_handlers[key]()
         else:
             return super(EntryWidget, self).keypress(size, key)
 
@@ -56,10 +61,11 @@ class ViColumns(urwid.Columns):
 
 
 class ViListBox(urwid.ListBox):
-    def __init__(self, key_bindings, *args, **kwargs):
+    def __init__(self, key_bindings, *args, before_keypress=None, **kwargs):
         super(ViListBox, self).__init__(*args, **kwargs)
 
         self.key_bindings = key_bindings
+        self.before_keypress = before_keypress  # called before a key is handled
         self._command_map = Util.define_keys(
             urwid.command_map.copy(),
             key_bindings,
@@ -83,14 +89,14 @@ class ViListBox(urwid.ListBox):
         return self.move_bottom()
 
     def move_top(self):
-        for i, item in enumerate(self.body):
-            if item.selectable():
+        for i in range(len(self.body)):
+            if self.body[i].selectable():
                 self.set_focus(i)
                 return
 
     def move_bottom(self):
-        for i, item in reversed(list(enumerate(self.body))):
-            if item.selectable():
+        for i in reversed(range(len(self.body))):
+            if self.body[i].selectable():
                 self.set_focus(i)
                 return
 
@@ -113,6 +119,8 @@ class ViListBox(urwid.ListBox):
             self.set_focus(pos)
 
     def keypress(self, size, key):
+        if self.before_keypress:
+            self.before_keypress()
         key = super(ViListBox, self).keypress(size, key)
         if self.key_bindings.is_bound_to(key, "home"):
             self.move_top()
@@ -120,3 +128,157 @@ class ViListBox(urwid.ListBox):
             self.move_bottom()
         else:
             return key
+
+
+class TaskWalker(urwid.ListWalker):
+    """List walker over tasks and group dividers that creates the widgets of a row on demand
+
+    create_item(task, due_date) and create_divider(text) create the widgets, only those of the
+    rows near the focus are kept.
+    """
+
+    def __init__(self, create_item, create_divider, keep=100):
+        self.create_item = create_item
+        self.create_divider = create_divider
+        self.keep = keep
+        self.set_rows([])
+
+    def set_rows(self, tasks, dividers=(), due_dates=None):
+        """Show tasks with a divider before some of them.
+
+        dividers is a list of (task index, text) ordered by task index, due_dates an optional
+        list of the due date to show for each task.
+        """
+        self.tasks = tasks
+        self.due_dates = due_dates
+        self.divider_tasks = [index for index, _ in dividers]
+        self.divider_texts = [text for _, text in dividers]
+        self.update_divider_rows()
+        self.update_task_indexes()
+        self.widgets = {}
+        self.focus = 0
+        self._modified()
+
+    def update_divider_rows(self):
+        self.divider_rows = [index + i for i, index in enumerate(self.divider_tasks)]
+
+    def update_task_indexes(self):
+        # task_id -> index of its first row in tasks (a task can be shown more than once)
+        self.task_indexes = {}
+        for index in range(len(self.tasks) - 1, -1, -1):
+            self.task_indexes[self.tasks[index].task_id] = index
+
+    def insert_task(self, index, task):
+        """Insert task before the task at index (and its divider)."""
+        self.tasks = self.tasks[:index] + [task] + self.tasks[index:]
+        if self.due_dates is not None:
+            self.due_dates = self.due_dates[:index] + [None] + self.due_dates[index:]
+        start = bisect.bisect_left(self.divider_tasks, index)
+        for i in range(start, len(self.divider_tasks)):
+            self.divider_tasks[i] += 1
+        self.update_divider_rows()
+        self.update_task_indexes()
+        self.widgets = {}
+        self._modified()
+
+    def __len__(self):
+        return len(self.tasks) + len(self.divider_tasks)
+
+    def __getitem__(self, position):
+        if position < 0 or position >= len(self):
+            raise IndexError(position)
+        widget = self.widgets.get(position)
+        if widget is None:
+            divider = bisect.bisect_right(self.divider_rows, position) - 1
+            if divider >= 0 and self.divider_rows[divider] == position:
+                widget = self.create_divider(self.divider_texts[divider])
+            else:
+                index = position - divider - 1
+                due_date = self.due_dates[index] if self.due_dates else None
+                widget = self.create_item(self.tasks[index], due_date)
+            self.widgets[position] = widget
+            if len(self.widgets) > 2 * self.keep:
+                # forget the widgets far from the focus
+                for pos in [pos for pos in self.widgets if abs(pos - self.focus) > self.keep]:
+                    del self.widgets[pos]
+        return widget
+
+    def get_task_position(self, task_id):
+        """Return the position of the first row of the task with task_id or None."""
+        index = self.task_indexes.get(task_id)
+        if index is None:
+            return None
+        return index + bisect.bisect_right(self.divider_tasks, index)
+
+    def get_focus(self):
+        if not len(self):
+            return (None, None)
+        return (self[self.focus], self.focus)
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def get_next(self, position):
+        if position + 1 >= len(self):
+            return (None, None)
+        return (self[position + 1], position + 1)
+
+    def get_prev(self, position):
+        if position <= 0:
+            return (None, None)
+        return (self[position - 1], position - 1)
+
+    def next_position(self, position):
+        if position + 1 >= len(self):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        return reversed(range(len(self))) if reverse else range(len(self))
+
+
+class WidgetCache:
+    """Least recently used widgets by key"""
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.widgets = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, valid=None):
+        """Return the widget for key or None, a widget for which valid(widget) is false is dropped."""
+        widget = self.widgets.get(key)
+        if widget is not None and valid is not None and not valid(widget):
+            del self.widgets[key]
+            widget = None
+        if widget is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.widgets.move_to_end(key)
+        return widget
+
+    def put(self, key, widget):
+        self.widgets[key] = widget
+        self.widgets.move_to_end(key)
+        while len(self.widgets) > self.size:
+            self.widgets.popitem(last=False)
+
+    def clear(self):
+        self.widgets.clear()
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.widgets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0,
+        }
@@ -37,9 +37,11 @@ class KeyBindings:
         self.key_bindings["toggle-sort-order"] = ["s"]
         self.key_bindings["toggle-wrapping"] = ["w"]
         self.key_bindings["toggle-view"] = ["v"]
+        self.key_bindings["toggle-agenda"] = ["a"]
         self.key_bindings["toggle-help"] = ["?"]
         self.key_bindings["search"] = ["/"]
         self.key_bindings["search-clear"] = ["C"]
+        self.key_bindings["toggle-fuzzy"] = ["tab"]
         self.key_bindings["add-due"] = ["+"]
         self.key_bindings["subtract-due"] = ["-"]
 
@@ -40,10 +40,12 @@ class MainHelp:
                         """\
                 {0} - toggle view
                 {1} - toggle word wrap
+                {2} - toggle agenda
                 """
                     ).format(
                         key_bindings["toggle-view"].ljust(key_column_width),
                         key_bindings["toggle-wrapping"].ljust(key_column_width),
+                        key_bindings["toggle-agenda"].ljust(key_column_width),
                     )
                 )
             ]
@@ -104,11 +106,13 @@ class MainHelp:
                 {1} - start search
                 {2} - clear search
                 {3} - toggle sort order
+                {4} - toggle fuzzy search (while searching)
                 """.format(
                             key_bindings["switch-context"].ljust(key_column_width),
                             key_bindings["search"].ljust(key_column_width),
                             key_bindings["search-clear"].ljust(key_column_width),
                             key_bindings["toggle-sort-order"].ljust(key_column_width),
+                            key_bindings["toggle-fuzzy"].ljust(key_column_width),
                         )
                     )
                 )
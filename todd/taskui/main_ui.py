@@ -2,17 +2,23 @@ import os
 import urwid
 import collections
 from todd.tasklib import Tasklist, Util
+from todd.tasklib.clock import Clock
+from todd.tasklib.index import TaskCounter
+from todd.tasklib.search import SearchSession
 from todd import taskui
 
 
 class MainUI:
     def __init__(self, tasklist, key_bindings, colorscheme):
         self.view_days = 7
+        self.agenda = False
+        self.agenda_days = 14
         self.wrapping = collections.deque(["clip", "space"])
         self.sort_order = collections.deque(["Due", "Prio", "Created"])
 
         self.tasklist = tasklist
-        self.items = None
+        self.clock = Clock()  # date snapshot, updated by fill_listbox
+        self.counts = TaskCounter()  # of the tasks shown
         self.key_bindings = key_bindings
 
         self.colorscheme = colorscheme
@@ -25,12 +31,26 @@ class MainUI:
         self.active_context = None
 
         self.search_highlight = False
+        self.search = None  # highlighted search of the rows
         self.search_string = ""
+        self.search_fuzzy = False
+        self.search_session = SearchSession(tasklist)
 
         self.skip_task_list_updated = False
 
-        self.listbox = taskui.ViListBox(self.key_bindings, urwid.SimpleListWalker([]))
-        urwid.connect_signal(self.listbox.body, "modified", self.task_list_updated)
+        # refills and header updates are done once the event loop is idle, see render
+        self.deferred = False
+        self.rendering = False
+        self.pending_fill = False
+        self.pending_keep = None
+        self.pending_focus = None
+        self.pending_header = False
+        self.header_message = ("", "header_message")
+
+        self.item_cache = taskui.WidgetCache()
+        self.walker = taskui.TaskWalker(self.create_item, self.create_divider)
+        self.listbox = taskui.ViListBox(self.key_bindings, self.walker, before_keypress=self.flush)
+        urwid.connect_signal(self.walker, "modified", self.task_list_updated)
         self.frame = urwid.Frame(urwid.AttrMap(self.listbox, "plain"), header=None, footer=None)
         self.view = taskui.ViColumns(self.key_bindings, [("weight", 5, self.frame)])
         self.help_panel = None
@@ -41,8 +61,65 @@ class MainUI:
         self.loop.screen.set_terminal_properties(colors=256)
         # also see self.loop.widget
 
+    def refresh(self, keep=None, focus=None):
+        """Refill the list before the screen is drawn next.
+
+        keep is a task to show even if it is filtered, focus the id of the task to select
+        (or "top").
+        """
+        self.pending_fill = True
+        if keep:
+            self.pending_keep = keep
+        if focus is not None:
+            self.pending_focus = focus
+        self.header_message = ("", "header_message")
+        self.schedule()
+
     def update_header(self, message="", color="header_message"):
-        today = Util.get_today_str()
+        self.header_message = (message, color)
+        self.pending_header = True
+        self.schedule()
+
+    def schedule(self):
+        if not self.deferred:
+            self.render()
+
+    def render(self):
+        """Do the pending refill and header update, called when the event loop is idle."""
+        if self.pending_fill:
+            keep, focus = self.pending_keep, self.pending_focus
+            self.pending_fill = False
+            self.pending_keep = None
+            self.pending_focus = None
+            self.rendering = True
+            try:
+                self.fill_listbox(keep)
+                if focus == "top":
+                    self.listbox.move_top()
+                elif focus is not None:
+                    self.select_by_id(focus)
+            finally:
+                self.rendering = False
+            self.pending_header = True
+        if self.pending_header:
+            self.pending_header = False
+            self.draw_header()
+
+    def flush(self):
+        # the keys of one input batch are all handled before the idle callback, a key for the
+        # list has to see the rows as they are after the previous key
+        if self.pending_fill:
+            self.render()
+
+    def draw_header(self):
+        message, color = self.header_message
+        today = self.clock.today_str
+        if self.agenda:
+            view = " agenda:{0}days ".format(self.agenda_days)
+        elif self.view_days >= 0:
+            view = " v:{0}days ".format(self.view_days)
+        else:
+            view = ""
         self.frame.header = urwid.AttrMap(
             urwid.Columns(
                 [
@@ -50,17 +127,14 @@ class MainUI:
                         [
                             (
                                 "header_task_count",
-                                "{0} Tasks ".format(len(Tasklist.filter_pending(self.items))),
+                                "{0} Tasks ".format(self.counts.pending),
                             ),
                             (
                                 "header_task_due_count",
-                                " {0} due ".format(len(Tasklist.filter_due(self.items, today))),
+                                " {0} due ".format(self.counts.get_due_counts(today)[0]),
                             ),
                             ("header_sort", " s:{0} ".format(self.sort_order[0])),
-                            (
-                                "header_view",
-                                " v:{0}days ".format(self.view_days) if self.view_days >= 0 else "",
-                            ),
+                            ("header_view", view),
                         ]
                     ),
                     urwid.Text((color, message), align="right"),
@@ -83,8 +157,7 @@ class MainUI:
 
     def toggle_sort_order(self):
         self.sort_order.rotate(1)
-        self.fill_listbox()
-        self.listbox.move_top()
+        self.refresh(focus="top")
 
     def toggle_context_panel(self):
         def create_context_panel():
@@ -135,11 +208,15 @@ class MainUI:
 
     def toggle_view(self):
         self.view_days = 7 if self.view_days < 0 else -1
-        self.fill_listbox()
+        self.refresh()
+
+    def toggle_agenda(self):
+        self.agenda = not self.agenda
+        self.refresh(focus="top")
 
     def toggle_wrapping(self):
         self.wrapping.rotate(1)
-        self.fill_listbox()
+        self.refresh()
 
     def update_footer(self, name):
         if name == "edit-help":
@@ -155,9 +232,26 @@ class MainUI:
                 "footer",
             )
         elif name == "search":
-            search_box = taskui.EntryWidget(self.search_string, self.commit_search)
+            search_box = taskui.EntryWidget(
+                self.search_string,
+                self.commit_search,
+                {
+                    key: self.toggle_fuzzy_search
+                    for key in self.key_bindings.getKeyBinding("toggle-fuzzy")
+                },
+            )
+            hint = " {0}: {1} ".format(
+                self.key_bindings["toggle-fuzzy"], "exact" if self.search_fuzzy else "fuzzy"
+            )
             self.frame.footer = urwid.AttrMap(
-                urwid.Columns([(1, urwid.Text("/")), search_box]), "footer"
+                urwid.Columns(
+                    [
+                        (1, urwid.Text("~" if self.search_fuzzy else "/")),
+                        search_box,
+                        (len(hint), urwid.Text(hint)),
+                    ]
+                ),
+                "footer",
             )
             urwid.connect_signal(search_box, "change", self.search_updated)
             self.frame.set_focus("footer")
@@ -183,10 +277,10 @@ class MainUI:
             self.frame.footer = None
 
     def select_by_id(self, task_id):
-        for i, item in enumerate(self.listbox.body):
-            if type(item) is taskui.TaskItem and item.task.task_id == task_id:
-                self.listbox.set_focus(i)
-                return False
+        row = self.walker.get_task_position(task_id)
+        if row is not None:
+            self.listbox.set_focus(row)
+            return False
         self.listbox.move_top()
         return True
 
@@ -196,16 +290,15 @@ class MainUI:
 
     def archive_tasks(self):
         self.tasklist.archive_tasks(Tasklist.filter_done_or_del)
-        self.fill_listbox()
+        self.refresh()
 
     def archive_undo(self):
         t = self.tasklist.undo_archive()
-        self.fill_listbox()
-        self.select_by_id(t.task_id)
+        self.refresh(focus=t.task_id if t else None)
 
     def reload_tasklist_from_file(self):
-        self.tasklist.reload()
-        self.fill_listbox()
+        if self.tasklist.reload():
+            self.refresh()
         self.update_header("Reloaded")
 
     # called by watcher
@@ -214,7 +307,7 @@ class MainUI:
             self.reload_tasklist_from_file()
 
     def task_list_updated(self):
-        if not self.skip_task_list_updated:
+        if not self.skip_task_list_updated and not self.rendering:
             self.update_header()
 
     def adjust_priority(self, focus, mod):
@@ -237,16 +330,13 @@ class MainUI:
             due = Util.mod_date_by(due, text)
             focus.task.set_due(due)
             self.tasklist.save()
-            self.fill_listbox()
+            self.refresh()
         except Exception:
             self.update_header("Invalid format!")
 
     def add_new_task(self):
         task = self.tasklist.insert_new(-1, "")
-        t = taskui.TaskItem(
-            task, self.key_bindings, self.colorscheme, self, wrapping=self.wrapping[0]
-        )
-        self.listbox.body.insert(0, t)
+        self.walker.insert_task(0, task)
         self.listbox.move_top()
         self.skip_task_list_updated = True
         self.edit_task(normal_mode=False)
@@ -272,36 +362,30 @@ class MainUI:
             # new empty task
             self.tasklist.delete_by_id(t.task_id)
             t = None
-        self.fill_listbox(t)
+        self.refresh(keep=t)
 
     def toggle_done(self, focus):
         t = focus.task
         if t.is_done():
             t.set_done(False)
             self.tasklist.save()
-            self.fill_listbox()
+            self.refresh()
         else:
-            last = t.raw
-            rec = t.set_done()
-            if rec:
-                self.tasklist.insert_new(-1, t.raw)  # insert done
-                t.update(last)
-                t.set_due(rec)
-                t.set_creation_date(Util.get_today())
-            else:
+            if not self.tasklist.complete_task(t):
                 self.listbox.move_offs(1)
-            self.archive_tasks()  # save & update list
+            self.refresh()
 
     def delete_task(self, focus):
         t = focus.task
         if t.is_deleted():
             t.set_deleted(False)
             self.tasklist.save()
-            self.fill_listbox()
+            self.refresh()
         else:
             self.listbox.move_offs(1)
             t.set_deleted()
-            self.archive_tasks()  # save & update list
+            self.tasklist.archive_task(t)
+            self.refresh()
 
     def start_search(self):
         self.update_footer("search")
@@ -310,7 +394,12 @@ class MainUI:
         self.search_string = search_string
         if search_string:
             self.search_highlight = True
-            self.fill_listbox()
+            self.refresh()
+
+    def toggle_fuzzy_search(self):
+        self.search_fuzzy = not self.search_fuzzy
+        self.update_footer("search")
+        self.refresh()
 
     def commit_search(self, text):
         self.frame.set_focus("body")
@@ -318,75 +407,147 @@ class MainUI:
         if not Tasklist.prep_search(self.search_string):
             self.search_string = ""
             self.update_footer("")
-        self.fill_listbox()
+        self.refresh()
 
     def clear_search_term(self):
         if self.search_string:
             self.search_string = ""
             self.update_footer("")
-            self.fill_listbox()
+            self.refresh()
 
     def context_list_updated(self):
         focus = self.context_list.get_focus()[0].original_widget.text
         if focus == "(all)":
             self.active_context = None
-            self.fill_listbox()
+            self.refresh()
         else:
             self.active_context = "@" + focus
-            self.fill_listbox()
+            self.refresh()
 
     def fill_listbox(self, keep=None):
         # clear
         focus, _ = self.listbox.get_focus()
         last_id = focus.task.task_id if type(focus) is taskui.TaskItem else -1
 
-        sort_by = self.sort_order[0]
-        items = self.tasklist.get_items_sorted(sort_by.lower())
+        self.clock.update()
+        if self.agenda:
+            self.fill_agenda(last_id)
+            return
+
+        sort_by = self.sort_order[0].lower()
 
-        items = Tasklist.filter_by_days(items, self.view_days)
+        def get_items():
+            items = self.tasklist.get_items_sorted(sort_by, self.active_context)
+            return Tasklist.filter_by_days(items, self.view_days)
 
-        if self.active_context:
-            items = Tasklist.filter_context(items, self.active_context)
+        # the search session only calls get_items when one of these changed
+        key = (
+            self.tasklist.revision,
+            sort_by,
+            self.active_context,
+            self.view_days,
+            self.clock.today,
+        )
+        fuzzy = self.search_fuzzy and Tasklist.prep_search(self.search_string, True)
+        if fuzzy:
+            # ranked by score, the result can't be narrowed while typing
+            items = Tasklist.search(fuzzy, self.search_session.search(key, get_items, ""))
+        else:
+            items = self.search_session.search(key, get_items, self.search_string)
 
         search = None
-        if self.search_string != "":
-            search = Tasklist.prep_search(self.search_string)
-            items = Tasklist.search(search, items)
-            if not self.search_highlight:
-                search = None
+        if self.search_highlight:
+            search = fuzzy or Tasklist.prep_search(self.search_string)
 
         if keep and not any(item for item in items if item.task_id == keep.task_id):
-            items.append(keep)
-
-        self.items = items
-        self.listbox.body.clear()
-        self.listbox.body.extend(
-            [
-                taskui.TaskItem(
-                    t,
-                    self.key_bindings,
-                    self.colorscheme,
-                    self,
-                    wrapping=self.wrapping[0],
-                    search=search,
-                )
-                for t in items
-            ]
-        )
+            items = items + [keep]
 
-        # insert dividers
-        ins = [(-1, "# Overdue"), (0, "# Due"), (1, "# This Week"), (2, "# Next")]
-        for i, item in enumerate(self.listbox.body):
-            while len(ins) and ins[0][0] < item.status[1]:
-                ins.pop(0)
-            if len(ins) and ins[0][0] == item.status[1]:
-                self.listbox.body.insert(
-                    i, urwid.AttrMap(urwid.Text(("divider", ins[0][1]), align="left"), "divider")
-                )
+        if fuzzy or Tasklist.prep_search(self.search_string):
+            self.counts = TaskCounter()
+            self.counts.build(items)
+        else:
+            # kept up to date by the tasklist
+            due_by = Util.get_today_str(self.view_days) if self.view_days >= 0 else None
+            self.counts = self.tasklist.get_counter(self.active_context, due_by)
+        self.search = search
+
+        # dividers (unless ranked)
+        ins = [] if fuzzy else [(-1, "# Overdue"), (0, "# Due"), (1, "# This Week"), (2, "# Next")]
+        dividers = []
+        for i, t in enumerate(items):
+            if not ins:
+                break
+            status = self.clock.get_status(t)[1]
+            while len(ins) and ins[0][0] < status:
                 ins.pop(0)
+            if len(ins) and ins[0][0] == status:
+                dividers.append((i, ins.pop(0)[1]))
+
+        self.walker.set_rows(items, dividers)
+        self.select_by_id(last_id)
 
+    def fill_agenda(self, last_id):
+        # the due tasks and the projected occurrences of recurring tasks by date
+        agenda = self.tasklist.get_agenda(self.agenda_days, self.clock.today)
+        tasks = list({id(task): task for _, task, _ in agenda}.values())
+        if self.active_context:
+            tasks = [t for t in tasks if self.active_context in t.contexts]
+        search = Tasklist.prep_search(self.search_string, self.search_fuzzy)
+        if search and self.search_fuzzy:
+            # grouped by date, every match is shown
+            tasks = search.filter(tasks)
+        else:
+            tasks = Tasklist.search(search, tasks)
+        shown = set(id(t) for t in tasks)
+
+        self.counts = TaskCounter()
+        self.counts.build(tasks)
+        self.search = search if self.search_highlight else None
+        rows = []
+        due_dates = []
+        dividers = []
+        last = None
+        for date, task, projected in agenda:
+            if id(task) not in shown:
+                continue
+            group = "Overdue" if date < self.clock.today else date.isoformat()
+            if group != last:
+                last = group
+                if group != "Overdue":
+                    group += " " + self.clock.get_date_name(group)
+                dividers.append((len(rows), "# " + group))
+            rows.append(task)
+            due_dates.append(date.isoformat() if projected else None)
+
+        self.walker.set_rows(rows, dividers, due_dates)
         self.select_by_id(last_id)
-        self.update_header()
+
+    def create_item(self, task, due_date=None):
+        # rows of unchanged tasks are reused
+        key = (
+            task.task_id,
+            task.raw,
+            self.wrapping[0],
+            self.search and (type(self.search), tuple(self.search.terms)),
+            self.clock.today,
+            due_date,
+        )
+        item = self.item_cache.get(key, lambda item: item.raw == task.raw)
+        if item is None:
+            item = taskui.TaskItem(
+                task,
+                self.key_bindings,
+                self.colorscheme,
+                self,
+                wrapping=self.wrapping[0],
+                search=self.search,
+                due_date=due_date,
+            )
+            self.item_cache.put(key, item)
+        return item
+
+    def create_divider(self, text):
+        return urwid.AttrMap(urwid.Text(("divider", text), align="left"), "divider")
 
     def keystroke(self, key):
 
@@ -409,6 +570,8 @@ class MainUI:
             self.toggle_context_panel()
         elif self.key_bindings.is_bound_to(key, "toggle-view"):
             self.toggle_view()
+        elif self.key_bindings.is_bound_to(key, "toggle-agenda"):
+            self.toggle_agenda()
         elif self.key_bindings.is_bound_to(key, "toggle-wrapping"):
             self.toggle_wrapping()
         elif self.key_bindings.is_bound_to(key, "toggle-sort-order"):
@@ -451,12 +614,26 @@ class MainUI:
         elif self.key_bindings.is_bound_to(key, "reload"):
             self.reload_tasklist_from_file()
 
+    def set_midnight_alarm(self):
+        self.loop.set_alarm_in(self.clock.get_seconds_to_midnight() + 1, self.midnight)
+
+    def midnight(self, loop=None, user_data=None):
+        # relative dates and the due dividers change with the date
+        if self.clock.update():
+            self.refresh()
+        self.set_midnight_alarm()
+
     def main(self, enable_word_wrap=False):
 
         if enable_word_wrap:
             self.toggle_wrapping()
 
-        self.fill_listbox()
+        self.refresh()
+        self.set_midnight_alarm()
+        # from now on render before the screen gets drawn (urwid draws in its own idle callback,
+        # which is added by loop.run after this one)
+        self.deferred = True
+        self.loop.event_loop.enter_idle(self.render)
 
         pipe = self.loop.watch_pipe(self.file_updated)
 
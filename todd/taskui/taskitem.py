@@ -1,12 +1,22 @@
 import urwid
-from todd.tasklib import Tasklist, Util
+from todd.tasklib import Tasklist
 from urwid_viedit import ViEdit
 
 
 class TaskItem(urwid.WidgetWrap):
-    def __init__(self, task, key_bindings, colorscheme, parent_ui, wrapping="clip", search=None):
+    def __init__(
+        self,
+        task,
+        key_bindings,
+        colorscheme,
+        parent_ui,
+        wrapping="clip",
+        search=None,
+        due_date=None,
+    ):
         super(TaskItem, self).__init__("")
         self.task = task  # type Task
+        self.due_date = due_date  # projected due date of a recurring task (agenda)
         self.key_bindings = key_bindings
         self.wrapping = wrapping
         self.colorscheme = colorscheme
@@ -20,8 +30,10 @@ class TaskItem(urwid.WidgetWrap):
 
     def update_task(self, search=None):
         t = self.task
-        today = Util.get_today()
-        self.status = t.get_status(today.isoformat(), Util.get_next_monday().isoformat())
+        self.raw = t.raw  # shown text
+        clock = self.parent_ui.clock
+        due_date = self.due_date or t.due_date
+        self.status = clock.get_status(t, due_date)
 
         if search:
             show = Tasklist.get_search_highlight(search, t.raw)
@@ -35,8 +47,10 @@ class TaskItem(urwid.WidgetWrap):
             else:
                 text_col = "plain"
 
-            due_name = Util.get_date_name(t.get_due(), today=today)
-            if t.rec_int:
+            due_name = clock.get_date_name(due_date)
+            if self.due_date:
+                rec_text = "(projected)"
+            elif t.rec_int:
                 if t.rec_int[0] == "+":
                     rec_text = "every " + t.rec_int[1:]
                 else: